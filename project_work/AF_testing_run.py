@@ -7,6 +7,7 @@ from datetime import datetime
 from utils.cerebellum import AdaptiveFilterCerebellum
 from utils.robot import SingleLink
 import utils.torch_model as torch_model
+from utils.mlp_inference import NumpyMLP
 import utils.camera_tools as ct
 from FableAPI.fable_init import api
 
@@ -145,6 +146,8 @@ api.setAccurate(accurateX, accurateY, module)
 # Load the trained model
 model = torch_model.MLPNet(2, 24, 16, 8, 2)
 model.load_state_dict(torch.load('trained_model_diff.pth', weights_only=True))
+# NumPy forward pass for the control loop, same outputs without the torch call overhead
+model = NumpyMLP.from_state_dict(model.state_dict())
 
 # Instantiate class
 coordinateStore1 = CoordinateStore()
@@ -240,16 +243,14 @@ for i in range(n_steps*n_trials):
                 if adaptive_filter_toggle:
                     error    += C_t
             # MLP
-            with torch.no_grad():
-                # tmeas1 = api.getPos(0,module)
-                # tmeas2 = api.getPos(1,module)
-                print(error)
-                outp = model(torch.tensor(error).float())
-                tau_MLP = outp.numpy()
-                
-                print("MLP:",tau_MLP)
-                print("Current position: ", theta)
-                print("Reference: ", theta_ref)
+            # tmeas1 = api.getPos(0,module)
+            # tmeas2 = api.getPos(1,module)
+            print(error)
+            tau_MLP = model(error)
+
+            print("MLP:",tau_MLP)
+            print("Current position: ", theta)
+            print("Reference: ", theta_ref)
             tau = tau_MLP
             
             # Iterate simulation dynamics
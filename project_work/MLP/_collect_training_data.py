@@ -1,9 +1,14 @@
 import numpy as np
 import camera_tools.camera_tools as ct
 import cv2
+import sys
 import datetime
+from pathlib import Path
 from FableAPI.fable_init import api
 
+sys.path.append(str(Path(__file__).resolve().parents[1])) # project_work, for utils
+from utils.dataset import DatasetWriter, LAYOUTS
+
 # We have provided camera_tools as a stand-alone python file in ~/camera_tools/camera_tools.py
 # The same functions are available in the Conda 'biocontrol' venv that is provided
 
@@ -67,14 +72,16 @@ class TestClass:
     def __init__(self, num_datapoints):
         self.i = 0
         self.num_datapoints = num_datapoints
-        self.data = np.zeros( (num_datapoints, 4) )
+        # Flushed to disk (with an fsync) every 10 samples, not in every step of the robot loop.
+        # A crash loses at most the last 9 samples, close() writes the rest
+        self.data = DatasetWriter(f"data_{datetime.datetime.now():%Y%m%d_%H%M%S}.dset", *LAYOUTS['center'], flush_every=10)
         self.time_of_move = datetime.datetime.now()
         self.timer = 0.5
 
     def go(self):
         while True:
             if self.i >= num_datapoints:
-                np.savetxt("data.csv", self.data, delimiter=",")
+                self.data.close()
                 return True
             
             img = ct.capture_image(cam)
@@ -85,7 +92,7 @@ class TestClass:
                     tmeas1 = api.getPos(0,module)
                     tmeas2 = api.getPos(1,module)
                     
-                    self.data[self.i,:] = np.array([tmeas1, tmeas2, x, y])
+                    self.data.append([tmeas1, tmeas2, x, y])
                     self.i += 1
                     print(self.i,x, y)
 
@@ -100,6 +107,7 @@ class TestClass:
 
 test = TestClass(num_datapoints)
 test.go()
+test.data.close()
 
 print('Terminating')
 api.terminate()
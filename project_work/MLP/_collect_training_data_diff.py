@@ -1,9 +1,14 @@
 import numpy as np
 import camera_tools as ct
 import cv2
+import sys
 import datetime
+from pathlib import Path
 from FableAPI.fable_init import api
 
+sys.path.append(str(Path(__file__).resolve().parents[1])) # project_work, for utils
+from utils.dataset import DatasetWriter, LAYOUTS
+
 # We have provided camera_tools as a stand-alone python file in ~/camera_tools/camera_tools.py
 # The same functions are available in the Conda 'biocontrol' venv that is provided
 
@@ -68,8 +73,9 @@ class TestClass:
     def __init__(self, num_datapoints):
         self.i = 0
         self.num_datapoints = num_datapoints
-        self.data = np.zeros( (num_datapoints, 4) )
-        # self.data = np.zeros( (num_datapoints, 6) ) # for angle
+        # Flushed to disk (with an fsync) every 10 samples, not in every step of the robot loop.
+        # A crash loses at most the last 9 samples, close() writes the rest
+        self.data = DatasetWriter(f"data_{datetime.datetime.now():%Y%m%d_%H%M%S}.dset", *LAYOUTS['diff'], flush_every=10)
         self.time_of_move = datetime.datetime.now()
         self.timer = 0.5
         self.xy = [None,None]
@@ -83,7 +89,7 @@ class TestClass:
                 self.t[0] = api.getPos(0,module)
                 self.t[1] = api.getPos(1,module)
             if self.i >= num_datapoints:
-                np.savetxt("data.csv", self.data, delimiter=",")
+                self.data.close()
                 return True
             frame = ct.capture_image(cam)
             cv2.imshow("test", frame)
@@ -103,8 +109,8 @@ class TestClass:
                     tr1 = tmeas1 - self.t[0]
                     tr2 = tmeas2 - self.t[1]
                     
-                    self.data[self.i,:] = np.array([tr1, tr2, xr, yr])
-                    # self.data[self.i,:] = np.array([tr1, tr2, tmeas1, tmeas2, xr, yr]) # for angle
+                    self.data.append([tr1, tr2, xr, yr])
+                    # self.data.append([tr1, tr2, tmeas1, tmeas2, xr, yr]) # for angle
                     self.i += 1
                     # print(self.i,xr,yr)
 
@@ -121,6 +127,7 @@ class TestClass:
 
 test = TestClass(num_datapoints)
 test.go()
+test.data.close()
 
 print('Terminating')
 api.terminate()
@@ -1,11 +1,16 @@
 import numpy as np
 import torch
 import _torch_model as torch_model
+import sys
+from pathlib import Path
 import cv2
 import camera_tools as ct
 from FableAPI.fable_init import api
 from datetime import datetime
 
+sys.path.append(str(Path(__file__).resolve().parents[1])) # project_work, for utils
+from utils.checkpoint import load_predictor
+
 test_second = False
 
 
@@ -13,12 +18,6 @@ cam = ct.prepare_camera()
 print(cam.isOpened())  # False
 i = 0
 
-data = np.loadtxt("data_diff.csv", delimiter=",")
-end_pos = data[:,2:].T
-x = torch.from_numpy(end_pos.T).float()
-data_mean = x.mean(axis=0)
-data_std  = x.std(axis=0)
-
 # Initialize the camera first.. waits for it to detect the green block
 def initialize_camera(cam):
     while True:
@@ -57,8 +56,9 @@ accurateY = 'HIGH'
 api.setAccurate(accurateX, accurateY, module)
 
 # TODO Load the trained model
-model1 = torch_model.MLPNet(2, 24, 16, 8, 2)
-model1.load_state_dict(torch.load('trained_model_this_is_good.pth', weights_only=True))
+# Sizes from the weights, (x + 750)/1500 input scaling fused into the first layer.
+# A checkpoint saved by the training scripts carries its own scaling: load_predictor('checkpoint_diff.pth') of _train_pytorch_diff.py
+model1 = load_predictor('trained_model_this_is_good.pth', input_offset=-750., input_scale=1500.)
 if test_second:
     model2 = torch_model.MLPNet(2, 24, 2)
     model2.load_state_dict(torch.load('active_model_9.pth'))
@@ -108,12 +108,8 @@ while True:
         print("click_point",coordinateStore1.point)
         print("inp",inp)
         print("x,y",x,y)
-        inp = (inp+750)/1500.
-        print("inp_n",inp)
         # shows the non-active learning model prediction
-        with torch.no_grad():
-            outp = model1(inp)
-            t = outp.numpy()
+        t = model1(inp.numpy())
         t0 = api.getPos(0,module)
         t1 = api.getPos(1,module)
         print("t",t)
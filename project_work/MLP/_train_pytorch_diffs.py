@@ -1,10 +1,14 @@
+import sys
 import pickle
 import numpy as np
 import matplotlib.pyplot as plt
 import torch
 import _torch_model as torch_model
+from pathlib import Path
 
-from tqdm import tqdm # progress bar
+sys.path.append(str(Path(__file__).resolve().parents[1])) # project_work, for utils
+from utils.torch_trainer import Trainer, train_val_split
+from utils.checkpoint import save_checkpoint
 
 # Load data
 # data = pickle.load( open( "training_data.p", "rb" ) )
@@ -24,8 +28,8 @@ if torch.cuda.is_available():
 x = torch.from_numpy(end_ang_pos.T).float()
 y = torch.from_numpy(angles.T).float()
 print(x.mean(axis=0)) # [284.9700, 318.9700], [-46.9600,  -3.2021,  -1.8200,   1.3300]
-x -= x.mean(axis=0)
-# TODO split the training set and test set
+x_mean = x.mean(axis=0)
+x -= x_mean
 # Eventually normalize the data
 
 if device == 'cuda':
@@ -34,7 +38,7 @@ if device == 'cuda':
 
 
 # Define neural network - an example
-model = torch_model.MLPNet(4, 24, 2)
+model = torch_model.MLPNet(4, 24, 16, 8, 2)
 # model = torch_model.Net(n_feature=2, n_hidden1=h, n_hidden2=h, n_output=2)
 #print(model)
 optimizer = torch.optim.Adam(model.parameters(), lr=0.005)
@@ -45,29 +49,22 @@ num_epochs = 50000
 g = 0.999
 scheduler = torch.optim.lr_scheduler.StepLR(optimizer, step_size=100, gamma=g)
 
-l_vec = np.zeros(num_epochs)
+# Full batch (the recordings are 200 rows), 20% held out for validation, stop when it has not improved for 200 checks
+x_train, y_train, x_val, y_val = train_val_split(x, y, val_fraction=0.2)
+trainer = Trainer(model, optimizer, loss_func, scheduler, batch_size=None, eval_every=10, patience=200,
+                  checkpoint_path='best_model_diffs.pth')
+hist = trainer.fit(x_train, y_train, num_epochs, x_val, y_val, progress=True)
+print(f"Best validation MSE {hist['val_loss'].min():.4f} after {len(hist['train_loss'])} epochs")
 
-for t in tqdm(range(num_epochs)):
-    # TODO Train network
-    prediction = model(x) # Forward pass prediction. Saves intermediary values required for backwards pass
-    loss = loss_func(prediction, y) # Computes the loss for each example, using the loss function defined above
-    optimizer.zero_grad() # Clears gradients from previous iteration
-    loss.backward() # Backpropagation of errors through the network
-    optimizer.step() # Updating weights
-    scheduler.step()
+# Weights with the sizes, input scaling and training data fingerprint, for utils.checkpoint.load_predictor
+save_checkpoint('checkpoint_diffs.pth', model, input_offset=x_mean.tolist(), input_scale=1.0,
+                data=data, data_files=["data_diffs.csv"], val_loss=float(hist['val_loss'].min()))
 
-    l = loss.data
-    if device == 'cuda':
-        l = l.cpu()
-    #print(l.numpy())
-    l_vec[t] = l.numpy()
-
-    # TODO Test the network
-
-plt.plot(l_vec)
+plt.plot(hist['train_loss'], label='train')
+plt.plot(hist['eval_epoch'], hist['val_loss'], label='validation')
 plt.yscale('log')
+plt.legend()
 
-torch.save(model.state_dict(), 'trained_model.pth')
 plt.show()
 
 
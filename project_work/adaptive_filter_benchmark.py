@@ -0,0 +1,70 @@
+import time
+import numpy as np
+
+from utils.bases import MultiInputSecondOrderBases
+from utils.cerebellum import AdaptiveFilterCerebellum
+
+## Benchmark settings, as in exercise 2.7
+Ts = 1e-3
+n_steps = 20000
+beta = 1e-5
+
+class ReferenceCerebellum:
+    """ The original AdaptiveFilterCerebellum step on MultiInputSecondOrderBases """
+    def __init__(self, c):
+        self.beta = c.beta
+        self.p = MultiInputSecondOrderBases(c.dt, c.n_inputs, c.tau_r, c.tau_d)
+        self.weights = np.zeros_like(c.weights, dtype=np.float64)
+
+    def step(self, x, error):
+        self.p.step(x)
+        self.C = np.dot(self.weights.T, self.p.value)
+        self.weights += self.beta * np.outer(self.p.value, error)
+        return self.C
+
+def run(c, u, e):
+    t0 = time.perf_counter()
+    C = np.zeros((len(u), e.shape[1]))
+    for i in range(len(u)):
+        C[i] = c.step(u[i], e[i])
+    return C, (time.perf_counter() - t0)/len(u)
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+
+    print(f"{'inputs':>6} {'bases':>6} {'reference [us]':>15} {'float64 [us]':>13} {'float32 [us]':>13} {'max |dC| f64':>13} {'max |dC| f32':>13}")
+    for n_inputs, n_bases in [(1, 4), (2, 4), (2, 50), (6, 200)]:
+        u = rng.normal(size=(n_steps, n_inputs))
+        e = rng.normal(size=(n_steps, n_inputs))
+
+        # Same seed, so both draw the same tau_r/tau_d
+        np.random.seed(n_bases)
+        c64 = AdaptiveFilterCerebellum(Ts, n_inputs, n_inputs, n_bases, beta)
+        np.random.seed(n_bases)
+        c32 = AdaptiveFilterCerebellum(Ts, n_inputs, n_inputs, n_bases, beta, dtype=np.float32)
+        ref = ReferenceCerebellum(c64)
+
+        C_ref, t_ref = run(ref, u, e)
+        C_64, t_64 = run(c64, u, e)
+        C_32, t_32 = run(c32, u, e)
+
+        print(f"{n_inputs:>6} {n_bases:>6} {t_ref*1e6:>15.1f} {t_64*1e6:>13.1f} {t_32*1e6:>13.1f} "
+              f"{np.abs(C_64 - C_ref).max():>13.2e} {np.abs(C_32 - C_ref).max():>13.2e}")
+
+    ## Block mode over a known input sequence, exercise 2.7 length (1 kHz x 10 s x 30 trials)
+    n_block = 300000
+    n_inputs, n_bases = 1, 4
+    u = rng.normal(size=(n_block, n_inputs))
+    e = rng.normal(size=(n_block, n_inputs))
+
+    np.random.seed(0)
+    c_step = AdaptiveFilterCerebellum(Ts, n_inputs, n_inputs, n_bases, beta)
+    np.random.seed(0)
+    c_block = AdaptiveFilterCerebellum(Ts, n_inputs, n_inputs, n_bases, beta)
+
+    C_step, t_step = run(c_step, u, e)
+    t0 = time.perf_counter()
+    C_block = c_block.step_block(u, e)
+    t_block = time.perf_counter() - t0
+
+    print(f"\n{n_block} steps: step loop {t_step*n_block:.2f} s, step_block {t_block:.2f} s, max |dC| {np.abs(C_step - C_block).max():.2e}")
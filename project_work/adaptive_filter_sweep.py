@@ -0,0 +1,78 @@
+import time
+import argparse
+import numpy as np
+import matplotlib.pyplot as plt
+
+from utils.cerebellum import AdaptiveFilterEnsemble
+from utils.robot import SingleLinkBatch
+
+def run_sweep(betas, n_bases, n_draws, Ts=1e-3, T_end=10, n_trials=30, T=5, Kp=30, Kv=0):
+    """
+        The recurrent adaptive filter loop of exercise 2.7, for every combination of
+        beta x n_bases x tau draw at once. Returns the RMSE of every trial, shape
+        (len(betas), len(n_bases), n_draws, n_trials).
+    """
+    grid = np.stack(np.meshgrid(betas, n_bases, np.arange(n_draws), indexing='ij'), axis=-1).reshape(-1, 3)
+    M = len(grid)
+
+    c = AdaptiveFilterEnsemble(Ts, 1, 1, grid[:, 1].astype(int), grid[:, 0])
+
+    plant = SingleLinkBatch(Ts, M)
+
+    n_steps = int(T_end/Ts) # in one trial
+    sq_error = np.zeros((n_trials, M))
+    C_t = np.zeros(M)
+
+    # Unstable configurations blow up to nan without affecting the others
+    with np.errstate(over='ignore', invalid='ignore'):
+        for i in range(n_steps*n_trials):
+            t = i*Ts
+            theta_ref = np.pi * np.sin(2* np.pi * t/T)
+
+            # Feedback controller, with the cerebellar output added to the error
+            error = (theta_ref - plant.theta)
+            error_fb = error + C_t
+            tau_m = Kp * error_fb + Kv * (-plant.omega)
+
+            C_t = c.step(tau_m[:, None], error[:, None])[:, 0]
+
+            plant.step(tau_m)
+
+            sq_error[i//n_steps] += (theta_ref - plant.theta)**2
+
+    trial_error = np.sqrt(sq_error/n_steps)
+    return trial_error.T.reshape(len(betas), len(n_bases), n_draws, n_trials)
+
+def plot_sweep(trial_error, betas, n_bases):
+    fig, axs = plt.subplots(1, len(n_bases), sharey=True, squeeze=False, figsize=(4*len(n_bases), 4))
+    for j, nb in enumerate(n_bases):
+        ax = axs[0, j]
+        for k, beta in enumerate(betas):
+            # Mean over the tau draws
+            ax.plot(trial_error[k, j].mean(axis=0), label=f'beta={beta:.0e}')
+        ax.set_title(f'n_bases={nb}')
+        ax.set_xlabel('trial')
+    axs[0, 0].set_ylabel('RMSE [rad]')
+    axs[0, 0].legend()
+    plt.show()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Sweep beta and n_bases of the adaptive filter (exercise 2.7) in one run")
+    parser.add_argument("--betas", type=float, nargs="+", default=[1e-6, 3e-6, 1e-5, 3e-5])
+    parser.add_argument("--n-bases", type=int, nargs="+", default=[2, 4, 8, 16])
+    parser.add_argument("--draws", type=int, default=4, help="Random tau_r/tau_d draws per configuration")
+    parser.add_argument("--trials", type=int, default=30)
+    parser.add_argument("--plot", action="store_true")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    trial_error = run_sweep(args.betas, args.n_bases, args.draws, n_trials=args.trials)
+    print(f"{trial_error[..., 0].size} configurations in {time.perf_counter() - t0:.1f} s")
+
+    # Final trial RMSE, mean over the draws
+    print("beta \\ n_bases", *args.n_bases)
+    for k, beta in enumerate(args.betas):
+        print(f"{beta:.0e}", *[f"{e:.4f}" for e in trial_error[k, :, :, -1].mean(axis=1)])
+
+    if args.plot:
+        plot_sweep(trial_error, args.betas, args.n_bases)
@@ -0,0 +1,129 @@
+import time
+import numpy as np
+
+from utils.cmac2 import CMAC, MultiOutputCMAC, TileCodingCMAC, GaussianBasisFunction
+
+## Benchmark settings
+n_rfs_list = [11, 21, 31, 51, 71, 101]
+n_calls = 2000
+n_dim = 2 # as in cmac_testing.py
+
+xmin = [-170, -80]
+xmax = [170, 80]
+
+def predict_loop(c, x):
+    """ Reference implementation: the original double loop version of CMAC.predict """
+    phi = np.zeros((2, c.n_rfs))
+    for k in range(2):
+        phi[k] = GaussianBasisFunction(x[k], c.mu[k], c.sigma[k], c.n_dim)
+
+    B = np.zeros((c.n_rfs, c.n_rfs))
+    for i in range(c.n_rfs):
+        for j in range(c.n_rfs):
+            B[i,j] = phi[0][i] * phi[1][j]
+
+    return np.dot(c.w.ravel(), B.ravel())
+
+def time_per_call(f, inputs):
+    t0 = time.perf_counter()
+    for x in inputs:
+        f(x)
+    return (time.perf_counter() - t0)/len(inputs)
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    inputs = rng.uniform(low=np.array(xmin)[:, None], high=np.array(xmax)[:, None], size=(n_calls, 2, n_dim))
+
+    print(f"{'n_rfs':>6} {'loop [us]':>12} {'vectorized [us]':>16} {'speedup':>8} {'max |dy|':>10}")
+    for n_rfs in n_rfs_list:
+        c = CMAC(n_rfs, xmin, xmax, n_dim, .1)
+
+        # The loop version is slow for large grids, so time it on fewer calls
+        t_loop = time_per_call(lambda x: predict_loop(c, x), inputs[:max(20, n_calls*11//n_rfs**2)])
+        t_vec = time_per_call(c.predict, inputs)
+
+        max_diff = max(abs(c.predict(x) - predict_loop(c, x)) for x in inputs[:20])
+
+        print(f"{n_rfs:>6} {t_loop*1e6:>12.1f} {t_vec*1e6:>16.1f} {t_loop/t_vec:>8.1f} {max_diff:>10.2e}")
+
+    ## Truncated receptive fields: predict + learn per step, and deviation from the dense CMAC
+    # Independent uniform inputs lie far from every RF centre in most steps, where dense and
+    # truncated both see activations ~0. A smooth trajectory through the input range, the n_dim
+    # values of a dimension close together (theta and theta_ref of cmac_testing.py), keeps the
+    # RFs at the edge of the window active
+    n_steps = 2000
+    t = np.linspace(0, 1, n_steps)
+    centre = 0.9*np.array(xmax)[None, :]*np.sin(2*np.pi*np.array([3, 5])[None, :]*t[:, None])
+    trajectory = centre[:, :, None] + rng.normal(0, 1, size=(n_steps, 2, n_dim))
+
+    print(f"\n{'n_rfs':>6} {'tol':>7} {'k':>4} {'dense [us]':>12} {'truncated [us]':>15} {'max dropped':>12} {'max |dy|':>10} {'max |dw|':>10}")
+    for n_rfs in [11, 31, 101, 201]:
+        for tol in [1e-3, 1e-6, 1e-12]:
+            np.random.seed(0)
+            dense = CMAC(n_rfs, xmin, xmax, n_dim, .01)
+            np.random.seed(0)
+            trunc = CMAC(n_rfs, xmin, xmax, n_dim, .01, tol=tol)
+            if trunc.k == n_rfs:
+                continue
+
+            def step(c, x):
+                e = np.sin(x[:, 0]/50) - c.predict(x)
+                c.learn(e)
+                return e
+
+            t_dense = time_per_call(lambda x: step(dense, x), trajectory)
+            t_trunc = time_per_call(lambda x: step(trunc, x), trajectory)
+
+            # Same run again, untimed: the largest activation outside the window and the prediction error
+            np.random.seed(0)
+            dense = CMAC(n_rfs, xmin, xmax, n_dim, .01)
+            np.random.seed(0)
+            trunc = CMAC(n_rfs, xmin, xmax, n_dim, .01, tol=tol)
+            dropped, dy = 0.0, 0.0
+            for x in trajectory:
+                dy = max(dy, np.abs(step(dense, x) - step(trunc, x)).max())
+                B = dense.B.copy()
+                B[trunc.window] = 0
+                dropped = max(dropped, B.max())
+
+            print(f"{n_rfs:>6} {tol:>7.0e} {trunc.k:>4} {t_dense*1e6:>12.1f} {t_trunc*1e6:>15.1f} {dropped:>12.2e} {dy:>10.2e} {np.abs(dense.w - trunc.w).max():>10.2e}")
+
+    ## N-dimensional hashed tile coding against the 2D CMAC: weight memory and predict + learn per step
+    print(f"\n{'model':>28} {'inputs':>6} {'memory [kB]':>12} {'dense table [kB]':>17} {'step [us]':>10}")
+    for n_rfs in [15, 101]:
+        c = CMAC(n_rfs, xmin, xmax, n_dim, .01)
+        t = time_per_call(lambda x: step(c, x), inputs[:n_steps])
+        memory = (c.w.nbytes + c.B.nbytes)/1e3
+        print(f"{f'CMAC n_rfs={n_rfs}':>28} {2:>6} {memory:>12.1f} {memory:>17.1f} {t*1e6:>10.1f}")
+
+    n_tiles, n_tilings, memory_size = 15, 16, 2**16
+    for n_inputs in [2, 4, 6]:
+        c = TileCodingCMAC(n_tiles, [-1]*n_inputs, [1]*n_inputs, n_tilings, memory_size, .01/n_tilings)
+        X = rng.uniform(-1, 1, size=(n_steps, n_inputs))
+
+        def tile_step(x):
+            e = np.sin(x[0]) - c.predict(x)
+            c.learn(e)
+
+        t = time_per_call(tile_step, X)
+        dense = n_tilings*(n_tiles + 1)**n_inputs*c.w.itemsize/1e3 # unhashed table for the same tilings
+        print(f"{f'TileCodingCMAC {n_tilings}x{n_tiles}':>28} {n_inputs:>6} {(c.w.nbytes + c.B.nbytes)/1e3:>12.1f} {dense:>17.3g} {t*1e6:>10.1f}")
+
+    ## Two motors: one MultiOutputCMAC against two single output CMACs, predict + learn per step
+    print(f"\n{'n_rfs':>6} {'2x CMAC [us]':>13} {'MultiOutputCMAC [us]':>21}")
+    for n_rfs in [15, 51, 101]:
+        cs = [CMAC(n_rfs, xmin, xmax, n_dim, .01) for _ in range(2)]
+        m = MultiOutputCMAC(n_rfs, xmin, xmax, n_dim, .01, n_out=2)
+
+        def two_step(x):
+            for k, c in enumerate(cs):
+                e = np.sin(x[k]/50) - c.predict(x)
+                c.learn(e)
+
+        def multi_step(x):
+            e = np.sin(x/50).T - m.predict(x)
+            m.learn(e.sum(axis=0))
+
+        t_two = time_per_call(two_step, inputs[:n_steps])
+        t_multi = time_per_call(multi_step, inputs[:n_steps])
+        print(f"{n_rfs:>6} {t_two*1e6:>13.1f} {t_multi*1e6:>21.1f}")
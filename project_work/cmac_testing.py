@@ -4,7 +4,7 @@ import cv2
 import matplotlib.pyplot as plt
 from datetime import datetime
 
-from utils.cmac2 import CMAC
+from utils.cmac2 import MultiOutputCMAC
 from utils.robot import SingleLink
 import utils.torch_model as torch_model
 import utils.camera_tools as ct
@@ -43,7 +43,7 @@ xmax = np.array([490, 430]) - data_mean
 
 ## CMAC initialization
 n_rfs = 15
-c = CMAC(n_rfs, xmin, xmax, 2, .1)
+c = MultiOutputCMAC(n_rfs, xmin, xmax, 2, .1, n_out=2) # one output per motor
 
 T = 5
 
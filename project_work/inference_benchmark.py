@@ -0,0 +1,46 @@
+import time
+import numpy as np
+import torch
+
+import utils.torch_model as torch_model
+from utils.mlp_inference import NumpyMLP, freeze_torchscript, TORCH_RTOL
+
+n_calls = 20000
+
+def latency(f, inputs):
+    """ Mean time of one call in us, and the outputs """
+    outputs = []
+    t0 = time.perf_counter()
+    for x in inputs:
+        outputs.append(f(x))
+    return (time.perf_counter() - t0)/len(inputs)*1e6, np.array(outputs)
+
+if __name__ == '__main__':
+    model = torch_model.MLPNet(2, 24, 16, 8, 2)
+    model.load_state_dict(torch.load('trained_model_diff.pth', weights_only=True))
+    model.eval()
+
+    # Normalized camera errors as in AF_testing_run.py, one 2-vector per control step
+    rng = np.random.default_rng(0)
+    inputs = list(rng.uniform(0.2, 0.8, (n_calls, 2)))
+
+    def eager(x):
+        # What the control loop did before
+        with torch.no_grad():
+            return model(torch.tensor(x).float()).numpy()
+
+    scripted = freeze_torchscript(model)
+    def torchscript(x):
+        with torch.no_grad():
+            return scripted(torch.from_numpy(x).float()).numpy()
+
+    engine = NumpyMLP.from_state_dict(model.state_dict())
+
+    t_ref, y_ref = latency(eager, inputs)
+    print(f"{'backend':>12} {'latency [us]':>13} {'speedup':>8} {'max |diff|':>11}")
+    for name, f in [('eager', eager), ('torchscript', torchscript), ('numpy', engine)]:
+        t, y = latency(f, inputs)
+        print(f"{name:>12} {t:>13.1f} {t_ref/t:>8.1f} {np.abs(y - y_ref).max():>11.1e}")
+        # float32 rounding only, the backends sum in different orders
+        tol = TORCH_RTOL * np.abs(y_ref).max()
+        assert np.abs(y - y_ref).max() <= tol, f"{name} differs from eager torch by more than {tol:.1e}"
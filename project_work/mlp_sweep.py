@@ -0,0 +1,225 @@
+import copy
+import time
+import argparse
+import itertools
+import numpy as np
+import torch
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.torch_model import MLPNet
+from utils.torch_trainer import Trainer, train_val_split
+from utils.checkpoint import save_checkpoint
+
+class StackedMLPNet(torch.nn.Module):
+    """
+        K MLPNets evaluated as one batched forward pass. Every layer is a (K, n_in, n_out)
+        weight stack multiplied with torch.baddbmm. Networks with fewer hidden units are
+        zero padded to the widest, the padded units are masked to 0 so they get no gradient
+        and member k computes what nets[k] does, up to the rounding of the batched products.
+    """
+    def __init__(self, nets):
+        super(StackedMLPNet, self).__init__()
+        self.layer_names = ['hidden1', 'hidden2', 'hidden3', 'predict']
+        K = len(nets)
+        dtype = nets[0].predict.weight.dtype
+        self.sizes = [[getattr(net, name).in_features for name in self.layer_names] + [net.predict.out_features]
+                      for net in nets]
+        widths = np.max(self.sizes, axis=0)
+
+        self.weights = torch.nn.ParameterList()
+        self.biases = torch.nn.ParameterList()
+        self.unit_masks = []
+        for l, name in enumerate(self.layer_names):
+            W = torch.zeros(K, widths[l], widths[l+1], dtype=dtype)
+            b = torch.zeros(K, 1, widths[l+1], dtype=dtype)
+            mask = torch.zeros(K, 1, widths[l+1], dtype=dtype)
+            for k, net in enumerate(nets):
+                layer = getattr(net, name)
+                W[k, :layer.in_features, :layer.out_features] = layer.weight.detach().T
+                b[k, 0, :layer.out_features] = layer.bias.detach()
+                mask[k, 0, :layer.out_features] = 1
+            self.weights.append(torch.nn.Parameter(W))
+            self.biases.append(torch.nn.Parameter(b))
+            self.unit_masks.append(mask)
+        self.lrelu = torch.nn.LeakyReLU()
+        self.tanh = torch.nn.Tanh()
+
+    def forward(self, x):
+        # x: (N, n_feature) shared by all members, returns (K, N, n_output)
+        K = len(self.sizes)
+        x = x.expand(K, *x.shape)
+        activations = [self.lrelu, self.tanh, self.lrelu, None]
+        for W, b, mask, f in zip(self.weights, self.biases, self.unit_masks, activations):
+            x = torch.baddbmm(b, x, W)
+            if f is not None:
+                x = f(x) * mask
+        return x
+
+    def member_state_dict(self, k, params=None):
+        """ state_dict of member k, loadable by MLPNet(*self.sizes[k]). """
+        weights, biases = (self.weights, self.biases) if params is None else params
+        state = {}
+        for l, name in enumerate(self.layer_names):
+            n_in, n_out = self.sizes[k][l], self.sizes[k][l+1]
+            state[f'{name}.weight'] = weights[l][k, :n_in, :n_out].detach().T.clone()
+            state[f'{name}.bias'] = biases[l][k, 0, :n_out].detach().clone()
+        return state
+
+def train_stacked(configs, nets, x_train, y_train, x_val, y_val, num_epochs=5000, step_size=100, eval_every=10,
+                  betas=(0.9, 0.999), eps=1e-8):
+    """
+        Full batch Adam + StepLR training of all configs at once, each with its own lr and gamma.
+        Adam works per element, so one update of the stacked parameters with a learning rate per
+        member is the same as K separate optimizers.
+        Returns the best validation MSE of every member and their best state_dicts.
+    """
+    model = StackedMLPNet(nets)
+    params = list(model.weights) + list(model.biases)
+    K = len(configs)
+    lr0 = torch.tensor([c['lr'] for c in configs], dtype=params[0].dtype).view(K, 1, 1)
+    gamma = torch.tensor([c['gamma'] for c in configs], dtype=params[0].dtype).view(K, 1, 1)
+    m = [torch.zeros_like(p) for p in params]
+    v = [torch.zeros_like(p) for p in params]
+
+    best_loss = torch.full((K,), np.inf)
+    best = [p.detach().clone() for p in params]
+    for epoch in range(num_epochs):
+        # Sum of the member MSEs, the gradients of the members do not mix
+        loss = ((model(x_train) - y_train)**2).mean(dim=(1, 2)).sum()
+        for p in params:
+            p.grad = None
+        loss.backward()
+
+        lr = lr0 * gamma**(epoch // step_size)
+        t = epoch + 1
+        with torch.no_grad():
+            for p, m_p, v_p in zip(params, m, v):
+                m_p.mul_(betas[0]).add_(p.grad, alpha=1 - betas[0])
+                v_p.mul_(betas[1]).addcmul_(p.grad, p.grad, value=1 - betas[1])
+                denom = (v_p / (1 - betas[1]**t)).sqrt_().add_(eps)
+                p.sub_(lr / (1 - betas[0]**t) * m_p / denom)
+
+        if (epoch + 1) % eval_every == 0 or epoch == num_epochs - 1:
+            with torch.no_grad():
+                val_loss = ((model(x_val) - y_val)**2).mean(dim=(1, 2))
+                improved = val_loss < best_loss
+                best_loss = torch.where(improved, val_loss, best_loss)
+                for b, p in zip(best, params):
+                    b.copy_(torch.where(improved.view(K, 1, 1), p, b))
+
+    weights, biases = best[:len(model.weights)], best[len(model.weights):]
+    return best_loss.numpy(), [model.member_state_dict(k, (weights, biases)) for k in range(K)]
+
+def _pin_threads(n_threads):
+    torch.set_num_threads(n_threads)
+
+def train_single(config, net, x_train, y_train, x_val, y_val, num_epochs=5000, step_size=100, eval_every=10):
+    """ One config trained on its own with utils/torch_trainer.Trainer, the reference of check_stacked. """
+    optimizer = torch.optim.Adam(net.parameters(), lr=config['lr'])
+    scheduler = torch.optim.lr_scheduler.StepLR(optimizer, step_size=step_size, gamma=config['gamma'])
+    trainer = Trainer(net, optimizer, scheduler=scheduler, eval_every=eval_every)
+    hist = trainer.fit(x_train, y_train, num_epochs, x_val, y_val)
+    return hist['val_loss'].min(), net.state_dict()
+
+def check_stacked(configs, x_train, y_train, x_val, y_val, num_epochs=50, step_size=10, seed=0):
+    """
+        Trains the configs stacked and each on its own with torch.optim.Adam + StepLR from the
+        same initial weights. Returns the largest difference of the best validation MSEs and of
+        the weights. They are rounding errors only, in float64 ~1e-13, in float32 they grow with
+        the number of epochs, so keep the check short.
+    """
+    n_feature, n_output = x_train.shape[1], y_train.shape[1]
+    torch.manual_seed(seed)
+    nets = [MLPNet(n_feature, *c['hidden'], n_output).to(x_train.dtype) for c in configs]
+    stacked_loss, stacked_states = train_stacked(configs, [copy.deepcopy(net) for net in nets], x_train, y_train,
+                                                 x_val, y_val, num_epochs, step_size, eval_every=1)
+    loss_diff, weight_diff = 0.0, 0.0
+    for c, net, l, state in zip(configs, nets, stacked_loss, stacked_states):
+        single_loss, single_state = train_single(c, net, x_train, y_train, x_val, y_val, num_epochs, step_size, eval_every=1)
+        loss_diff = max(loss_diff, abs(float(single_loss) - float(l)))
+        weight_diff = max(weight_diff, max((single_state[k] - state[k]).abs().max().item() for k in state))
+    return loss_diff, weight_diff
+
+def _train_stacked_job(args):
+    return train_stacked(*args)
+
+def run_sweep(configs, x_train, y_train, x_val, y_val, num_epochs=5000, n_workers=4, threads_per_worker=1, seed=0):
+    """
+        Trains every config, dicts of 'hidden' (3 sizes), 'lr' and 'gamma', with train_stacked: one
+        StackedMLPNet per hidden size, so nothing is padded, and these stacks spread over a pool of
+        n_workers processes of threads_per_worker torch threads.
+        The training amplifies rounding differences over thousands of epochs into different minima.
+        Without padding every member computes the same products as its network trained alone, so
+        a config gets the same result whatever else is in the sweep and the ranking is reproducible.
+        Returns the best validation MSE and the best state_dict of every config.
+    """
+    n_feature, n_output = x_train.shape[1], y_train.shape[1]
+    # The same initial weights however the configs are grouped
+    torch.manual_seed(seed)
+    nets = [MLPNet(n_feature, *c['hidden'], n_output).to(x_train.dtype) for c in configs]
+
+    groups = {}
+    for i, c in enumerate(configs):
+        groups.setdefault(tuple(c['hidden']), []).append(i)
+    groups = list(groups.values())
+    val_loss = np.zeros(len(configs))
+    states = [None] * len(configs)
+
+    with ProcessPoolExecutor(n_workers, initializer=_pin_threads, initargs=(threads_per_worker,)) as pool:
+        jobs = [([configs[i] for i in g], [nets[i] for i in g], x_train, y_train, x_val, y_val, num_epochs)
+                for g in groups]
+        for g, (loss, group_states) in zip(groups, pool.map(_train_stacked_job, jobs)):
+            for i, l, s in zip(g, loss, group_states):
+                val_loss[i], states[i] = l, s
+    return val_loss, states
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Sweep MLPNet sizes, learning rate and StepLR gamma on camera/joint data")
+    parser.add_argument("csv", nargs="+", help="data_*.csv files, joint angles in the first two columns")
+    parser.add_argument("--hidden", type=int, nargs="+", default=[8, 16, 24, 48], help="width of the first hidden layer, the others are 2/3 and 1/3 of it")
+    parser.add_argument("--lr", type=float, nargs="+", default=[1e-3, 5e-3, 1e-2])
+    parser.add_argument("--gamma", type=float, nargs="+", default=[0.99, 0.999])
+    parser.add_argument("--epochs", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--check", type=int, default=0, metavar="EPOCHS",
+                        help="first compare stacked and single training of every config for this many epochs")
+    parser.add_argument("--out", default="best_model.pth")
+    args = parser.parse_args()
+
+    data = np.concatenate([np.loadtxt(f, delimiter=",", ndmin=2) for f in args.csv])
+    # float64, the rounding errors the training amplifies (see run_sweep) start 1e9 times smaller.
+    # The data are a few hundred rows, double precision costs little
+    x = torch.from_numpy(data[:, 2:])
+    y = torch.from_numpy(data[:, :2])
+    x_train, y_train, x_val, y_val = train_val_split(x, y, val_fraction=0.2)
+    # Only the mean is subtracted, as in MLP/_train_pytorch*.py and the models loaded from them
+    x_mean = x_train.mean(axis=0)
+    x_train, x_val = x_train - x_mean, x_val - x_mean
+
+    configs = [{'hidden': (h, max(1, 2*h//3), max(1, h//3)), 'lr': lr, 'gamma': g}
+               for h, lr, g in itertools.product(args.hidden, args.lr, args.gamma)]
+
+    if args.check:
+        loss_diff, weight_diff = check_stacked(configs, x_train, y_train, x_val, y_val, args.check)
+        print(f"Stacked vs single training, {args.check} epochs: val MSE difference {loss_diff:.2e}, weight difference {weight_diff:.2e}")
+
+    t0 = time.perf_counter()
+    val_loss, states = run_sweep(configs, x_train, y_train, x_val, y_val, args.epochs,
+                                 args.workers, args.threads_per_worker)
+    print(f"{len(configs)} configurations in {time.perf_counter() - t0:.1f} s")
+
+    order = np.argsort(val_loss)
+    print(f"{'hidden':>14} {'lr':>7} {'gamma':>6} {'val MSE':>10}")
+    for i in order:
+        c = configs[i]
+        print(f"{str(c['hidden']):>14} {c['lr']:>7.0e} {c['gamma']:>6} {val_loss[i]:>10.3f}")
+
+    best = configs[order[0]]
+    model = MLPNet(x.shape[1], *best['hidden'], y.shape[1])
+    model.load_state_dict(states[order[0]]) # cast to float32 as the trained_model*.pth
+    # With its input offset, load_predictor(args.out) takes the raw camera inputs
+    save_checkpoint(args.out, model, input_offset=x_mean.tolist(), input_scale=1.0, data=data,
+                    data_files=args.csv, val_loss=float(val_loss[order[0]]), lr=best['lr'], gamma=best['gamma'])
+    print(f"Saved MLPNet({x.shape[1]}, {', '.join(map(str, best['hidden']))}, {y.shape[1]}) to {args.out}, "
+          f"input mean {x_mean.tolist()}")
@@ -0,0 +1,52 @@
+import time
+import numpy as np
+
+from utils.robot import SingleLink, SingleLinkBatch
+
+## Benchmark settings
+T_end = 5
+T = 5 # period of the torque input
+
+def torque(t):
+    return 2*np.sin(2*np.pi*t/T)
+
+def simulate(plant, n_steps):
+    theta = np.zeros(n_steps)
+    t0 = time.perf_counter()
+    for i in range(n_steps):
+        plant.step(torque(i*plant.dt)) # zero order hold over dt
+        theta[i] = plant.theta
+    return theta, time.perf_counter() - t0
+
+if __name__ == '__main__':
+    print(f"{'Ts':>6} {'integrator':>14} {'substeps':>9} {'max |err| [rad]':>16} {'steps/s':>10}")
+    for Ts in [1e-3, 1e-2, 5e-2]:
+        n_steps = int(T_end/Ts)
+
+        # Reference: the adaptive solver with tight tolerances
+        ref = SingleLink(Ts, 'adaptive')
+        ref.rtol, ref.atol = 1e-11, 1e-12
+        theta_ref, _ = simulate(ref, n_steps)
+
+        for integrator, n_substeps in [('euler', None), ('euler', 1), ('semi-implicit', None), ('semi-implicit', 1),
+                                       ('rk4', None), ('rk4', 1), ('adaptive', None)]:
+            plant = SingleLink(Ts, integrator, n_substeps)
+            theta, t = simulate(plant, n_steps)
+            err = np.abs(theta - theta_ref).max()
+
+            substeps = plant.n_substeps if integrator != 'adaptive' else '-'
+            print(f"{Ts:>6} {integrator:>14} {substeps:>9} {err:>16.2e} {n_steps/t:>10.0f}")
+
+    ## Many links stepped as arrays, with random per-link parameters
+    Ts, n_steps = 1e-2, 200
+    print(f"\n{'links':>6} {'link steps/s':>13}")
+    for n_links in [1, 10, 100, 1000, 10000]:
+        rng = np.random.default_rng(0)
+        plant = SingleLinkBatch(Ts, n_links, m=rng.uniform(0.2, 0.3, n_links), b=rng.uniform(4, 6, n_links))
+
+        t0 = time.perf_counter()
+        for i in range(n_steps):
+            plant.step(np.full(n_links, torque(i*Ts)))
+        t = time.perf_counter() - t0
+
+        print(f"{n_links:>6} {n_links*n_steps/t:>13.0f}")
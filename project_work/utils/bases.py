@@ -1,5 +1,6 @@
 
 import numpy as np
+from scipy.signal import lfilter
 
 class FirstOrderBases:
     '''
@@ -71,6 +72,96 @@ class MultiInputSecondOrderBases:
     def value(self):
         return self.p.value
 
+
+class SecondOrderFilterBank:
+    '''
+        Same filters as MultiInputSecondOrderBases, two first order low pass filters in series
+        per input and basis, with all states in one preallocated array updated in place.
+        state[0] holds the filter outputs y1 and state[1] the previous inputs u1,
+        row 0 of each for the first (tau_r) filter and row 1 for the second (tau_d) filter.
+
+        tau_r/tau_d of shape (M, n_bases) give M independent banks stepped together,
+        the input then has shape (M, n_inputs) and the value (M, n_inputs*n_bases).
+    '''
+    def __init__(self, dt, n_inputs, tau_r, tau_d, dtype=np.float64):
+        self.n_inputs = n_inputs
+        self.n_bases = np.shape(tau_r)[-1]
+        self.batch = np.shape(tau_r)[:-1]
+        n = n_inputs*self.n_bases
+
+        self.tau_r = np.tile(tau_r, n_inputs)
+        self.tau_d = np.tile(tau_d, n_inputs)
+
+        # Filter coefficients of both filters, same as FirstOrderBases
+        self.ky = np.exp(-dt/np.stack([self.tau_r, self.tau_d]))
+        self.ku = (1 - self.ky).astype(dtype)
+        self.ky = self.ky.astype(dtype)
+
+        self.state = np.zeros((2, 2) + self.batch + (n,), dtype=dtype)
+        self._tmp = np.zeros((2,) + self.batch + (n,), dtype=dtype)
+
+        # Views into the state
+        self.y, self.u = self.state
+        # input repeated over the bases, (n_bases, ..., n_inputs) so it is written by broadcasting
+        self._u_in = np.moveaxis(self.u[0].reshape(self.batch + (n_inputs, self.n_bases)), -1, 0)
+
+    def step(self, input_signal):
+        # input signal has length num_inputs
+        # y = ky*y + ku*u for both filters at once
+        self.y *= self.ky
+        np.multiply(self.ku, self.u, out=self._tmp)
+        self.y += self._tmp
+
+        # The first filter gets the new input and feeds the second
+        self._u_in[...] = input_signal
+        self.u[1] = self.y[0]
+
+    def filter_block(self, input_signal):
+        """
+            Filter a whole input sequence (T, n_inputs) at once, same as calling step for every row.
+            Returns the bank outputs for every step, shape (T, n_inputs*n_bases),
+            and leaves the state as after the last step.
+        """
+        shape = self.batch + (self.n_inputs, self.n_bases)
+        u = np.asarray(input_signal, dtype=self.state.dtype).reshape((-1,) + self.batch + (self.n_inputs,))
+        T = len(u)
+
+        ky, ku = self.ky.reshape((2,) + shape), self.ku.reshape((2,) + shape)
+        y, u1 = self.y.reshape((2,) + shape), self.u.reshape((2,) + shape)
+
+        # Filtered in a (filter, batch..., basis, time, input) layout, so every lfilter reads and writes contiguous memory
+        u_t = np.ascontiguousarray(np.moveaxis(u, 0, -2)) # (batch..., T, n_inputs)
+        p_t = np.zeros((2,) + self.batch + (self.n_bases, T, self.n_inputs), dtype=self.state.dtype)
+
+        # All inputs share the time constants of a basis, so filter them together, one basis at a time
+        for m in np.ndindex(*self.batch):
+            for b in range(self.n_bases):
+                signal = u_t[m]
+                for k in range(2):
+                    i = (k,) + m + (0, b)
+                    zi = ky[i]*y[(k,) + m + (slice(None), b)] + ku[i]*u1[(k,) + m + (slice(None), b)] # output of the next step
+                    p_t[(k,) + m + (b,)], _ = lfilter([0, ku[i]], [1, -ky[i]], signal, axis=0, zi=zi[None, :])
+                    signal = p_t[(k,) + m + (b,)]
+
+        # Back to (filter, time, batch..., input, basis)
+        nb = len(self.batch)
+        p = p_t.transpose((0, nb + 2) + tuple(range(1, nb + 1)) + (nb + 3, nb + 1))
+
+        if len(u):
+            self.y[:] = p[:, -1].reshape(self.y.shape)
+            self._u_in[...] = u[-1]
+            self.u[1] = self.y[0]
+
+        return p[1].reshape((len(u),) + self.y.shape[1:])
+
+    def reset(self):
+        self.state.fill(0)
+
+    @property
+    def value(self):
+        return self.y[1]
+
+
 if __name__ == '__main__':
 
     tau_r = np.array([50e-3, 60e-3])
@@ -1,32 +1,39 @@
 import numpy as np
 
-from .bases import MultiInputSecondOrderBases
+from .bases import SecondOrderFilterBank
 
 class AdaptiveFilterCerebellum:
-    def __init__(self, dt, n_inputs, n_outputs, num_bases, beta):
+    def __init__(self, dt, n_inputs, n_outputs, num_bases, beta, dtype=np.float64):
+        self._setup(dt, n_inputs, n_outputs, num_bases, beta, (), dtype)
+
+    def _setup(self, dt, n_inputs, n_outputs, num_bases, beta, batch, dtype):
+        """ State of `batch` filters with num_bases bases each, () for a single filter """
         self.dt = dt
         self.beta = beta
         self.n_inputs = n_inputs
         self.n_outputs = n_outputs
-        
+
         # Initialize cortical bases
-        self.tau_r = np.random.uniform(low=2.0, high=50.0, size=num_bases)*1e-3 # ms
-        self.tau_d = np.random.uniform(low=50.0, high=750.0, size=num_bases)*1e-3 # ms
-        self.p = MultiInputSecondOrderBases(dt, n_inputs, self.tau_r, self.tau_d)
+        self.tau_r = np.random.uniform(low=2.0, high=50.0, size=batch + (num_bases,))*1e-3 # ms
+        self.tau_d = np.random.uniform(low=50.0, high=750.0, size=batch + (num_bases,))*1e-3 # ms
+        self.p = SecondOrderFilterBank(dt, n_inputs, self.tau_r, self.tau_d, dtype)
 
         # Weights
-        self.weights = np.zeros((n_inputs*num_bases, n_outputs))
+        self.weights = np.zeros(batch + (n_inputs*num_bases, n_outputs), dtype=dtype)
+        self._dW = np.zeros_like(self.weights) # weight update buffer
+        self._p_col = self.p.value[..., None] # view of the basis outputs, updated in place by the bank
 
         # Signals
-        self.C = np.zeros(n_outputs)
-        self.internal_error = np.zeros(n_outputs)
+        self.C = np.zeros(batch + (n_outputs,), dtype=dtype)
+        self.internal_error = np.zeros(batch + (n_outputs,), dtype=dtype)
 
     def step(self, x, error):
+        """ Returns the output C, note that the same array is overwritten by the next step """
         # Gives p_r, p_d and p at time t
         self.p.step(x)
 
         # Output of microcircuit
-        self.C = np.dot(self.weights.T, self.p.value)
+        np.dot(self.weights.T, self.p.value, out=self.C)
 
         # Update error signal and weights
         self._update_weights(error) # update before or after calc?
@@ -34,9 +41,81 @@ class AdaptiveFilterCerebellum:
         return self.C
 
 
+    def step_block(self, x, error=None, chunk=4096):
+        """
+            Run a whole known input sequence x (T, n_inputs) at once, e.g. open loop analysis or a logged run.
+            With error (T, n_outputs) the weights learn as if step(x[t], error[t]) was called for every t,
+            without it they stay fixed. Returns the outputs C, shape (T, n_outputs).
+            For an AdaptiveFilterEnsemble every row also has the member axis, x (T, M, n_inputs) etc.
+        """
+        p = self.p.filter_block(x) # the bases do not depend on the weights
+        if error is None:
+            C = np.einsum('t...n,...no->t...o', p, self.weights)
+            self.C[:] = C[-1] if len(C) else self.C
+            return C
+
+        error = np.asarray(error, dtype=self.weights.dtype).reshape((len(p),) + self.C.shape)
+        C = np.zeros((len(p),) + self.C.shape, dtype=self.weights.dtype)
+
+        # Weights at step t are the weights at the chunk start plus the updates of the earlier steps in the chunk
+        for t0 in range(0, len(p), chunk):
+            p_c, e_c = p[t0:t0+chunk], error[t0:t0+chunk]
+            dW = self.beta * p_c[..., :, None] * e_c[..., None, :]
+            W = np.cumsum(dW, axis=0)
+            W -= dW
+            W += self.weights
+
+            C[t0:t0+chunk] = np.einsum('t...n,t...no->t...o', p_c, W)
+            self.weights[:] = W[-1] + dW[-1]
+
+        self.C[:] = C[-1] if len(C) else self.C
+        return C
+
     def _update_weights(self, error):
-        self.weights += self.beta * np.outer(self.p.value, error)
+        np.multiply(self._p_col, error, out=self._dW) # outer(p, error)
+        self._dW *= self.beta
+        self.weights += self._dW
 
     @property
     def output(self):
-        return self.C
\ No newline at end of file
+        return self.C
+
+
+class AdaptiveFilterEnsemble(AdaptiveFilterCerebellum):
+    def __init__(self, dt, n_inputs, n_outputs, num_bases, beta, dtype=np.float64):
+        """
+            M adaptive filters stepped in lockstep, e.g. for parameter sweeps.
+            num_bases and beta are arrays of length M (scalars are used for all members),
+            every member draws its own tau_r/tau_d. Members with fewer bases than the largest
+            get zero-output bases in the padding. step_block takes x (T, M, n_inputs) and
+            error (T, M, n_outputs) and runs all members through the batched filter_block.
+        """
+        num_bases, beta = np.broadcast_arrays(np.atleast_1d(num_bases), np.atleast_1d(beta))
+        self.M = len(beta)
+        self.num_bases = num_bases
+        max_bases = num_bases.max()
+
+        # Every member gets max_bases bases and its own row of tau_r/tau_d
+        self._setup(dt, n_inputs, n_outputs, max_bases, beta.astype(dtype)[:, None, None], (self.M,), dtype)
+
+        # Padded bases never see their input, so they stay at zero and their weights never change
+        padding = np.tile(np.arange(max_bases) >= num_bases[:, None], n_inputs)
+        self.p.ku[:, padding] = 0
+
+        self._C_row = self.C[:, None, :]
+
+    def step(self, x, error):
+        """ x (M, n_inputs) and error (M, n_outputs), returns C (M, n_outputs), overwritten by the next step """
+        self.p.step(x)
+
+        # Output of every microcircuit
+        np.matmul(self.p.value[:, None, :], self.weights, out=self._C_row)
+
+        self._update_weights(error)
+
+        return self.C
+
+    def _update_weights(self, error):
+        np.multiply(self._p_col, np.reshape(error, (self.M, 1, self.n_outputs)), out=self._dW) # outer(p, error) per member
+        self._dW *= self.beta
+        self.weights += self._dW
@@ -0,0 +1,212 @@
+"""
+    Checkpoints that carry everything needed to use a trained MLP: the architecture and
+    its sizes, the input/output scaling used in training and a fingerprint of the training
+    data, saved together with the weights in one torch.save file.
+
+    The network sees (x - input_offset) / input_scale and its output y maps back to
+    y * output_scale + output_offset, e.g. input_offset=-750, input_scale=1500 for the
+    (x + 750)/1500 of the diff models.
+"""
+
+import os
+import hashlib
+import numpy as np
+
+from .mlp_inference import ARCHITECTURES, NumpyMLP, read_torch_file
+
+FORMAT = 'mlp-checkpoint-1'
+
+def fingerprint(data):
+    """ Short hash of a training data array, to tell which data a model was trained on. """
+    data = np.ascontiguousarray(data, dtype=np.float64)
+    h = hashlib.sha256(str(data.shape).encode())
+    h.update(data.tobytes())
+    return h.hexdigest()[:16]
+
+def architecture_of(state):
+    """ Architecture name and constructor sizes of a state_dict of utils/torch_model. """
+    name = next((a for a, (layers, _) in ARCHITECTURES.items() if all(f'{l}.weight' in state for l in layers)), None)
+    if name is None:
+        raise ValueError(f"unknown architecture, layers {sorted(state)}")
+    if name == 'MLPtorch':
+        return name, [] # fixed 2-16-2
+    layers = ARCHITECTURES[name][0]
+    # MLPNet(n_feature, n_hidden1, n_hidden2, n_hidden3, n_output), weights are (n_out, n_in)
+    return name, [int(state[f'{layers[0]}.weight'].shape[1])] + [int(state[f'{l}.weight'].shape[0]) for l in layers]
+
+def _as_list(v, n):
+    return np.broadcast_to(np.asarray(v, dtype=np.float64), (n,)).tolist()
+
+def save_checkpoint(path, model, input_offset=0.0, input_scale=1.0, output_offset=0.0, output_scale=1.0,
+                    data=None, data_files=None, **extra):
+    """
+        Saves the weights of a utils/torch_model network with its architecture, the scaling
+        of its inputs and outputs (scalars or one value per input/output), the fingerprint
+        of the training data and any extra metadata (validation error, notes, ...).
+    """
+    import torch
+    state = {k: v.detach().cpu() for k, v in model.state_dict().items()}
+    architecture, sizes = architecture_of(state)
+    layers = ARCHITECTURES[architecture][0]
+    n_in = state[f'{layers[0]}.weight'].shape[1]
+    n_out = state[f'{layers[-1]}.weight'].shape[0]
+
+    checkpoint = {
+        'format': FORMAT,
+        'architecture': architecture,
+        'sizes': sizes,
+        'input_offset': _as_list(input_offset, n_in),
+        'input_scale': _as_list(input_scale, n_in),
+        'output_offset': _as_list(output_offset, n_out),
+        'output_scale': _as_list(output_scale, n_out),
+        'data_fingerprint': None if data is None else fingerprint(data),
+        'data_files': [os.path.basename(f) for f in data_files] if data_files else [],
+        'state_dict': state,
+        **extra,
+    }
+    torch.save(checkpoint, path)
+
+def load_checkpoint(path, input_offset=None, input_scale=None, output_offset=None, output_scale=None):
+    """
+        Reads a checkpoint as a dict with numpy weights, without torch. A file holding only a
+        state_dict, as the older trained_model*.pth, is read too: its architecture is found from
+        the weight shapes and the scaling must be given here, as it is not in the file.
+    """
+    obj = read_torch_file(path)
+    scaling = {'input_offset': input_offset, 'input_scale': input_scale,
+               'output_offset': output_offset, 'output_scale': output_scale}
+    if obj.get('format') == FORMAT:
+        given = [k for k, v in scaling.items() if v is not None]
+        if given:
+            raise ValueError(f"{path} has its own scaling, {', '.join(given)} cannot be set")
+        return obj
+
+    state = dict(obj)
+    architecture, sizes = architecture_of(state)
+    layers = ARCHITECTURES[architecture][0]
+    n_in, n_out = state[f'{layers[0]}.weight'].shape[1], state[f'{layers[-1]}.weight'].shape[0]
+    defaults = {'input_offset': 0.0, 'input_scale': 1.0, 'output_offset': 0.0, 'output_scale': 1.0}
+    checkpoint = {'format': None, 'architecture': architecture, 'sizes': sizes,
+                  'data_fingerprint': None, 'data_files': [], 'state_dict': state}
+    for k, v in scaling.items():
+        checkpoint[k] = _as_list(defaults[k] if v is None else v, n_in if k.startswith('input') else n_out)
+    return checkpoint
+
+def load_predictor(path, dtype=np.float32, **scaling):
+    """
+        A NumpyMLP taking raw inputs and giving outputs in training units, in one call. The
+        input and output scaling are folded into the first and last layer, so the control
+        loop runs only the network.
+    """
+    checkpoint = load_checkpoint(path, **scaling)
+    state = checkpoint['state_dict']
+    layers, activations = ARCHITECTURES[checkpoint['architecture']]
+    weights = [np.asarray(state[f'{l}.weight'], dtype=np.float64) for l in layers]
+    biases = [np.asarray(state[f'{l}.bias'], dtype=np.float64) for l in layers]
+
+    # W (x - o)/s + b = (W/s) x + (b - W o/s)
+    offset, scale = np.array(checkpoint['input_offset']), np.array(checkpoint['input_scale'])
+    biases[0] = biases[0] - weights[0] @ (offset / scale)
+    weights[0] = weights[0] / scale
+    # (W h + b) s + o = (s W) h + (s b + o)
+    offset, scale = np.array(checkpoint['output_offset']), np.array(checkpoint['output_scale'])
+    weights[-1] = scale[:, None] * weights[-1]
+    biases[-1] = scale * biases[-1] + offset
+    return NumpyMLP(weights, biases, activations, dtype)
+
+def load_model(path, **scaling):
+    """ The torch model of a checkpoint, built with its stored sizes, and the checkpoint dict. """
+    import torch
+    from . import torch_model
+    checkpoint = load_checkpoint(path, **scaling)
+    model = getattr(torch_model, checkpoint['architecture'])(*checkpoint['sizes'])
+    model.load_state_dict({k: torch.from_numpy(v) for k, v in checkpoint['state_dict'].items()})
+    return model, checkpoint
+
+def check_round_trip(path, model, x, **kwargs):
+    """
+        Saves model with save_checkpoint(path, model, **kwargs) and reads it back. Returns the
+        largest difference to the torch model, on raw inputs x (n, n_in), of load_predictor
+        (one sample at a time and batched) and load_model, and whether every stored weight and
+        metadata value came back unchanged from load_checkpoint.
+    """
+    import torch
+    save_checkpoint(path, model, **kwargs)
+    checkpoint = load_checkpoint(path)
+
+    offset, scale = np.array(checkpoint['input_offset']), np.array(checkpoint['input_scale'])
+    out_offset, out_scale = np.array(checkpoint['output_offset']), np.array(checkpoint['output_scale'])
+    model.eval()
+    with torch.no_grad():
+        expected = model(torch.from_numpy((x - offset) / scale).float()).numpy() * out_scale + out_offset
+
+    predictor = load_predictor(path)
+    loaded, _ = load_model(path)
+    with torch.no_grad():
+        from_model = loaded(torch.from_numpy((x - offset) / scale).float()).numpy() * out_scale + out_offset
+    state = {k: v.detach().cpu().numpy() for k, v in model.state_dict().items()}
+    metadata = {k: v for k, v in kwargs.items() if k not in ('data', 'data_files')}
+    return {
+        'predictor': float(np.abs(np.array([predictor(xi) for xi in x]) - expected).max()),
+        'predictor_batch': float(np.abs(predictor.predict_batch(x) - expected).max()),
+        'load_model': float(np.abs(from_model - expected).max()),
+        'state_dict_equal': all(np.array_equal(checkpoint['state_dict'][k], v) for k, v in state.items()),
+        'metadata_equal': all(np.allclose(checkpoint[k], v) for k, v in metadata.items()) and
+                          checkpoint['data_fingerprint'] == (None if kwargs.get('data') is None else fingerprint(kwargs['data'])),
+    }
+
+class ModelRegistry:
+    """ A directory of named checkpoints, name.pth each. """
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.root, f'{name}.pth')
+
+    def save(self, name, model, **kwargs):
+        """ save_checkpoint under the given name, kwargs as for save_checkpoint. """
+        save_checkpoint(self.path(name), model, **kwargs)
+        return self.path(name)
+
+    def names(self):
+        return sorted(f[:-len('.pth')] for f in os.listdir(self.root) if f.endswith('.pth'))
+
+    def info(self, name):
+        """ The metadata of a checkpoint, everything but the weights. """
+        checkpoint = load_checkpoint(self.path(name))
+        return {k: v for k, v in checkpoint.items() if k != 'state_dict'}
+
+    def predictor(self, name, dtype=np.float32):
+        return load_predictor(self.path(name), dtype)
+
+    def model(self, name):
+        return load_model(self.path(name))
+
+if __name__ == '__main__':
+    import sys
+
+    if sys.argv[1:] == ['--round-trip']:
+        # python -m utils.checkpoint --round-trip: save and load back an untrained MLPNet
+        import tempfile
+        import torch
+        from .torch_model import MLPNet
+        torch.manual_seed(0)
+        model = MLPNet(2, 24, 16, 8, 2)
+        x = np.random.default_rng(0).uniform(-750, 750, (1000, 2))
+        with tempfile.TemporaryDirectory() as root:
+            result = check_round_trip(os.path.join(root, 'checkpoint.pth'), model, x,
+                                      input_offset=-750., input_scale=1500., output_offset=[10., -5.],
+                                      output_scale=[90., 45.], data=x, val_loss=0.5)
+        for k, v in result.items():
+            print(f"  {k}: {v}")
+        sys.exit(0 if result['state_dict_equal'] and result['metadata_equal'] and
+                 max(result['predictor'], result['predictor_batch'], result['load_model']) < 1e-3 else 1)
+
+    # Metadata of checkpoints, python -m utils.checkpoint trained_model_diff.pth ...
+    for path in sys.argv[1:]:
+        checkpoint = load_checkpoint(path)
+        print(path)
+        for k, v in checkpoint.items():
+            if k != 'state_dict':
+                print(f"  {k}: {v}")
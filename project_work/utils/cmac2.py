@@ -8,8 +8,11 @@ def GaussianBasisFunction(x, mu, sigma, n_dim=1):
     return np.exp(-exponent)
 
 class CMAC:
-    def __init__(self, n_rfs, xmin, xmax, n_dim=1, beta=1e-3):
-        """ Initialize the basis function parameters and output weights """
+    def __init__(self, n_rfs, xmin, xmax, n_dim=1, beta=1e-3, tol=None):
+        """ Initialize the basis function parameters and output weights
+            tol: if given, only the k nearest RFs per dimension whose activation can exceed tol
+                 are evaluated and updated (truncated mode), instead of all n_rfs x n_rfs
+        """
         self.n_rfs = n_rfs
         self.n_dim = n_dim
 
@@ -25,23 +28,58 @@ class CMAC:
 
         self.beta = beta
 
-        self.B = None
+        # Number of RFs per dimension that are evaluated, all of them unless truncated
+        self.k = self.n_rfs
+        if tol is not None:
+            # The exponent sums n_dim squared distances, at least n_dim times that of their mean, so
+            # RFs further than sigma*sqrt(-log(tol)/n_dim) from the mean of x have activation below tol
+            reach = np.sqrt(-np.log(tol)/n_dim) * 0.5/np.sqrt(-np.log(crossval)) # in units of the RF spacing
+            # x is at most half a spacing off the centre RF, the RF j places away is at least j - 0.5 from it
+            self.k = min(self.n_rfs, 2*max(int(np.ceil(reach - 0.5)), 0) + 1)
+
+        # Activation buffers, allocated once and reused by every predict call
+        self.phi = np.zeros((2, self.k))
+        self.B = np.zeros((self.k, self.k))
+        self.window = (slice(0, self.k), slice(0, self.k)) # part of w that B belongs to
+        self._rows = np.arange(2)[:, None]
+        self._cols = np.arange(self.k)[None, :]
         self.y = None
 
+    def _nearest_window(self, x):
+        """ Start index of the k RFs around x in each dimension """
+        centre = ((x.sum(axis=1)/x.shape[1] - self.mu[:, 0]) / (self.mu[:, 1] - self.mu[:, 0])).tolist()
+
+        # plain python on the two scalars, numpy call overhead dominates at this size
+        return [min(max(int(round(c)) - self.k//2, 0), self.n_rfs - self.k) for c in centre]
+
+    def activations(self, x):
+        """ Compute the receptive field activations for x into `self.B` (in place)
+            In truncated mode `B` only covers the RFs in `self.window`
+        """
+        x = np.asarray(x, dtype=float).reshape(2, -1)
+
+        mu = self.mu
+        if self.k < self.n_rfs:
+            start = self._nearest_window(x)
+            self.window = (slice(start[0], start[0] + self.k), slice(start[1], start[1] + self.k))
+            mu = self.mu[self._rows, self._cols + np.array(start)[:, None]]
+
+        # Same per-term summation as GaussianBasisFunction, for both input dimensions at once
+        self.phi.fill(0)
+        for i in range(self.n_dim):
+            self.phi += (x[:, i, None] - mu)**2/(self.sigma[:, None]**2)
+        np.exp(-self.phi, out=self.phi)
+
+        np.multiply(self.phi[0, :, None], self.phi[1, None, :], out=self.B) # outer product phi_0 x phi_1
+        return self.B
+
     def predict(self, x):
         """ Predict yhat given x
             Saves activations `B` for later weight update
         """
-        phi = np.zeros((2, self.n_rfs))
-        for k in range(2):
-            phi[k] = GaussianBasisFunction(x[k], self.mu[k], self.sigma[k], self.n_dim) # for i in phi_ki at the same time
+        self.activations(x)
 
-        self.B = np.zeros((self.n_rfs, self.n_rfs))
-        for i in range(self.n_rfs):
-            for j in range(self.n_rfs):
-                self.B[i,j] = phi[0][i] * phi[1][j]
-
-        yhat = np.dot(self.w.ravel(), self.B.ravel()) # Element-wise multiplication and summing of all elements
+        yhat = np.dot(self.w[self.window].ravel(), self.B.ravel()) # Element-wise multiplication and summing of all elements
 
         return yhat
 
@@ -51,7 +89,201 @@ class CMAC:
         For all weights at once.
         """
         for i in range(self.n_dim):
-            self.w += self.beta*e[i]*self.B
+            self.w[self.window] += self.beta*e[i]*self.B
+
+    def batch_activations(self, X):
+        """ Per-dimension activations phi for a batch of inputs
+            X has shape (N, 2), or (N, 2, n_dim); returns phi with shape (N, 2, n_rfs)
+        """
+        X = np.asarray(X, dtype=float).reshape(len(X), 2, -1)
+
+        phi = np.zeros((len(X), 2, self.n_rfs))
+        for i in range(self.n_dim):
+            phi += (X[:, :, i, None] - self.mu)**2/(self.sigma[:, None]**2)
+        return np.exp(-phi)
+
+    def _predict_phi(self, phi):
+        """ yhat (N,) for the batch activations phi of N inputs """
+        return np.sum((phi[:, 0] @ self.w) * phi[:, 1], axis=1) # phi_0^T w phi_1 per sample
+
+    def _learn_phi(self, phi, E):
+        """ Summed covariance update for the batch activations phi and errors E (N,) """
+        self.w += self.beta * (phi[:, 0].T * E) @ phi[:, 1]
+
+    def predict_batch(self, X):
+        """ Predict yhat for every row of X at once, returns shape (N,) """
+        return self._predict_phi(self.batch_activations(X))
+
+    def learn_batch(self, X, E):
+        """ 
+        Summed covariance update for a batch of inputs X and errors E
+        Same as calling predict(x) and learn(e) for every row, as E is fixed the order does not matter.
+        """
+        phi = self.batch_activations(X)
+        E = np.asarray(E, dtype=float).reshape(len(phi), -1).sum(axis=1) # sum over n_dim as in learn
+
+        self._learn_phi(phi, E)
+
+    def train_batch(self, X, yd, sequential=True):
+        """ 
+        Fit the desired outputs yd for a batch of inputs X, returns the errors (N,)
+        sequential: update the weights after every sample (as a predict/learn loop does),
+                    otherwise one summed update using the errors of the whole batch
+        """
+        phi = self.batch_activations(X)
+        yd = np.asarray(yd, dtype=float)
+
+        if not sequential:
+            e = yd - self._predict_phi(phi)
+            self._learn_phi(phi, e)
+            return e
+
+        # Activations are precomputed, only the weight dependent part stays in the loop
+        e = np.zeros(len(phi))
+        for n in range(len(phi)):
+            e[n] = yd[n] - self._predict_phi(phi[n:n+1])[0]
+            self._learn_phi(phi[n:n+1], e[n:n+1])
+        return e
+
+
+
+class MultiOutputCMAC(CMAC):
+    def __init__(self, n_rfs, xmin, xmax, n_dim=1, beta=1e-3, tol=None, n_out=2):
+        """ CMAC with n_out outputs sharing one activation computation
+            Weights have shape (n_rfs, n_rfs, n_out), each output learns from its own error
+        """
+        super().__init__(n_rfs, xmin, xmax, n_dim, beta, tol)
+        self.n_out = n_out
+
+        # Stored output-major so every w[:, :, o] is contiguous, updates along a length n_out axis are slow
+        self.w = np.random.normal(loc=0.0, scale=0.2, size=(self.n_out, self.n_rfs, self.n_rfs)).transpose(1, 2, 0)
+
+    def predict(self, x):
+        """ Predict yhat (n_out,) given x
+            Saves activations `B` for later weight update
+        """
+        self.activations(x)
+
+        yhat = np.einsum('ijo,ij->o', self.w[self.window], self.B) # sum of B*w per output
+
+        return yhat
+
+    def learn(self, e):
+        """ 
+        Update the weights using the covariance learning rule
+        e has one error per output
+        """
+        for o in range(self.n_out):
+            self.w[self.window + (o,)] += self.beta*e[o]*self.B
+
+    def predict_batch(self, X):
+        """ Predict yhat for every row of X at once, returns shape (N, n_out) """
+        phi = self.batch_activations(X)
+
+        return np.einsum('ni,ijo,nj->no', phi[:, 0], self.w, phi[:, 1], optimize=True)
+
+    def learn_batch(self, X, E):
+        """ Summed covariance update for a batch of inputs X and errors E (N, n_out) """
+        phi = self.batch_activations(X)
+        E = np.asarray(E, dtype=float).reshape(len(phi), self.n_out)
+
+        self.w += self.beta * np.einsum('ni,nj,no->ijo', phi[:, 0], phi[:, 1], E, optimize=True)
+
+    def train_batch(self, X, yd, sequential=True):
+        """ 
+        Fit the desired outputs yd (N, n_out) for a batch of inputs X, returns the errors (N, n_out)
+        See CMAC.train_batch
+        """
+        phi = self.batch_activations(X)
+        yd = np.asarray(yd, dtype=float).reshape(len(phi), self.n_out)
+
+        if not sequential:
+            e = yd - np.einsum('ni,ijo,nj->no', phi[:, 0], self.w, phi[:, 1], optimize=True)
+            self.w += self.beta * np.einsum('ni,nj,no->ijo', phi[:, 0], phi[:, 1], e, optimize=True)
+            return e
+
+        e = np.zeros((len(phi), self.n_out))
+        for n in range(len(phi)):
+            B = np.outer(phi[n, 0], phi[n, 1])
+            e[n] = yd[n] - np.einsum('ijo,ij->o', self.w, B)
+            for o in range(self.n_out):
+                self.w[:, :, o] += self.beta*e[n, o]*B
+        return e
+
+
+class TileCodingCMAC(CMAC):
+    def __init__(self, n_tiles, xmin, xmax, n_tilings=8, memory_size=2**16, beta=1e-3, seed=0):
+        """ N-dimensional CMAC with classic offset tilings and a hashed weight memory
+            n_tiles:     tiles per input dimension in each tiling
+            n_tilings:   number of overlapping tilings, each input activates one tile per tiling
+            memory_size: number of weights, fixed no matter the input dimension (collisions are shared)
+            beta:        learning rate per active tile
+            The activations are the indices of the active weights instead of the Gaussian RF grid of
+            CMAC, so CMAC.__init__ is not used. predict_batch, learn_batch and train_batch are CMAC's.
+        """
+        self.xmin = np.asarray(xmin, dtype=float)
+        self.xmax = np.asarray(xmax, dtype=float)
+        self.n_inputs = len(self.xmin)
+        self.n_tiles = n_tiles
+        self.n_tilings = n_tilings
+        self.memory_size = memory_size
+
+        self.width = (self.xmax - self.xmin)/n_tiles
+
+        # Tiling t is shifted by t/n_tilings of a tile along the displacement vector (1, 3, 5, ...)
+        displacement = 2*np.arange(self.n_inputs) + 1
+        self.offsets = (np.arange(n_tilings)[:, None] * displacement / n_tilings) % 1
+
+        # Random odd multipliers for the hash of (tile coordinates, tiling index)
+        rng = np.random.default_rng(seed)
+        self.hash_mult = rng.integers(1, 2**31, size=self.n_inputs + 1, dtype=np.int64) | 1
+        self.tiling_hash = np.arange(n_tilings, dtype=np.int64) * self.hash_mult[-1]
+
+        self.w = np.zeros(memory_size) # output is a sum of n_tilings weights, so start at zero
+        self.beta = beta
+
+        self.B = None # indices of the active weights, one per tiling
+        self.y = None
+
+    def activations(self, x):
+        """ Indices of the active weights for x, shape (n_tilings,); saved in `self.B` """
+        x = np.asarray(x, dtype=float)
+
+        coords = np.floor((x - self.xmin)/self.width + self.offsets).astype(np.int64) # (n_tilings, n_inputs)
+        self.B = (coords @ self.hash_mult[:-1] + self.tiling_hash) % self.memory_size
+        return self.B
+
+    def predict(self, x):
+        """ Predict yhat given x
+            Saves the active weight indices `B` for later weight update
+        """
+        self.activations(x)
+
+        yhat = self.w[self.B].sum()
+
+        return yhat
+
+    def learn(self, e):
+        """ 
+        Update the active weights with the error e
+        A vector e is summed, as in CMAC.learn
+        """
+        np.add.at(self.w, self.B, self.beta*np.sum(e)) # add.at, as hash collisions can repeat an index
+
+    def batch_activations(self, X):
+        """ Active weight indices for a batch of inputs X (N, n_inputs), returns shape (N, n_tilings) """
+        X = np.asarray(X, dtype=float)
+
+        coords = np.floor((X[:, None, :] - self.xmin)/self.width + self.offsets).astype(np.int64)
+        return (coords @ self.hash_mult[:-1] + self.tiling_hash) % self.memory_size
+
+    def _predict_phi(self, phi):
+        """ yhat (N,) for the active weight indices phi (N, n_tilings) """
+        return self.w[phi].sum(axis=1)
+
+    def _learn_phi(self, phi, E):
+        """ Summed update of the active weights of phi (N, n_tilings) with the errors E (N,) """
+        np.add.at(self.w, phi, self.beta*E[:, None])
 
 
 if __name__ == '__main__':
@@ -60,29 +292,21 @@ if __name__ == '__main__':
     xmin = [0, 0]
     xmax = [1, 1]
 
-    c = CMAC(n_rfs, xmin, xmax, 1e-2)
+    c = CMAC(n_rfs, xmin, xmax, beta=1e-2)
     # print(c.w.shape)
 
-    for _ in tqdm(range(1000)):
-        e_vec = []
-        for x1 in np.linspace(0, 1, 11):
-            for x2 in np.linspace(0, 1, 11):
-                x = [x1, x2]
-
-                yhat = c.predict(x)
-
-                yd = np.arctan2(x[0], x[1])
-
-                e = yd - yhat
+    x1, x2 = np.meshgrid(np.linspace(0, 1, 11), np.linspace(0, 1, 11), indexing='ij')
+    X = np.stack([x1.ravel(), x2.ravel()], axis=1)
+    yd = np.arctan2(X[:, 0], X[:, 1])
 
-                c.learn(e)
-                e_vec.append(e**2)
+    for _ in tqdm(range(1000)):
+        e = c.train_batch(X, yd)
 
-        # print(np.mean(e_vec))
+        # print(np.mean(e**2))
 
     # Test values
     x = [0.5, 0.5]
     print(c.predict(x), np.arctan2(x[0], x[1]))
 
     x = [0.2, 0.5]
-    print(c.predict(x), np.arctan2(x[0], x[1]))
\ No newline at end of file
+    print(c.predict(x), np.arctan2(x[0], x[1]))
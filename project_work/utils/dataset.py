@@ -0,0 +1,258 @@
+"""
+    Binary dataset files for the camera/joint training data.
+
+    Layout: a fixed HEADER_SIZE byte header (MAGIC, then JSON padded with spaces)
+    followed by the rows, n_columns values of `dtype` each, appended one sample at
+    a time. The row count is never stored, it follows from the file size, so a run
+    that is aborted keeps every row written before the last flush. The header holds
+    the column names, their units and the mean/std of every column over the rows.
+"""
+
+import os
+import json
+import numpy as np
+
+MAGIC = b'BRDSET1\n'
+HEADER_SIZE = 4096 # the rows start page aligned, memory maps of them are cheap
+
+# Columns and units written by the collectors in project_work/MLP. Center and diff recordings both
+# have 4 columns, so the layout of a CSV cannot be told from its shape:
+#   center: data_center.csv (_collect_training_data.py)
+#   diff:   data_diff.csv, data_markus.csv, data_diff_simons.csv (_collect_training_data_diff.py)
+#   diffs:  data_diffs.csv, diffs with the joint angles they start from
+LAYOUTS = {
+    'center': (['t1', 't2', 'x', 'y'], ['deg', 'deg', 'px', 'px']),
+    'diff': (['dt1', 'dt2', 'dx', 'dy'], ['deg', 'deg', 'px', 'px']),
+    'diffs': (['dt1', 'dt2', 't1', 't2', 'dx', 'dy'], ['deg', 'deg', 'deg', 'deg', 'px', 'px']),
+}
+
+def read_header(path):
+    """ Returns the header dict of a dataset file. """
+    with open(path, 'rb') as f:
+        raw = f.read(HEADER_SIZE)
+    if not raw.startswith(MAGIC):
+        raise ValueError(f"{path} is not a dataset file")
+    return json.loads(raw[len(MAGIC):].decode('utf-8'))
+
+def _write_header(f, header):
+    raw = MAGIC + json.dumps(header).encode('utf-8')
+    if len(raw) > HEADER_SIZE:
+        raise ValueError(f"header of {len(raw)} bytes does not fit in {HEADER_SIZE}")
+    f.seek(0)
+    f.write(raw.ljust(HEADER_SIZE, b' '))
+
+def _n_rows(path, header):
+    row_bytes = len(header['columns']) * np.dtype(header['dtype']).itemsize
+    return (os.path.getsize(path) - HEADER_SIZE) // row_bytes
+
+class DatasetWriter:
+    """
+        Appends samples to a dataset file as they arrive. Rows are written straight
+        to the file and flushed to disk every `flush_every` rows, together with the
+        updated normalization constants in the header.
+        append=True continues an existing file with the same columns.
+    """
+    def __init__(self, path, columns, units=None, dtype='<f8', flush_every=1, append=False):
+        self.path = path
+        self.flush_every = flush_every
+        self.n_pending = 0
+
+        if append and os.path.exists(path):
+            self.header = read_header(path)
+            if self.header['columns'] != list(columns):
+                raise ValueError(f"columns {list(columns)} do not match {self.header['columns']} of {path}")
+            self.dtype = np.dtype(self.header['dtype'])
+            self.n_rows = _n_rows(path, self.header)
+            self.f = open(path, 'r+b')
+            # Drop a partly written last row
+            self.f.truncate(HEADER_SIZE + self.n_rows * len(columns) * self.dtype.itemsize)
+            # The header stats only cover the rows up to the last flush, recount them over every row
+            self.sum = np.zeros(len(columns))
+            self.sumsq = np.zeros(len(columns))
+            if self.n_rows:
+                rows = np.memmap(path, dtype=self.dtype, mode='r', offset=HEADER_SIZE, shape=(self.n_rows, len(columns)))
+                for start in range(0, self.n_rows, 1 << 16):
+                    chunk = rows[start:start + (1 << 16)].astype(np.float64)
+                    self.sum += chunk.sum(axis=0)
+                    self.sumsq += (chunk**2).sum(axis=0)
+                del rows
+        else:
+            self.dtype = np.dtype(dtype)
+            units = [''] * len(columns) if units is None else list(units)
+            if len(units) != len(columns):
+                raise ValueError("one unit per column is needed")
+            self.header = {'columns': list(columns), 'units': units, 'dtype': self.dtype.str}
+            self.n_rows = 0
+            self.sum = np.zeros(len(columns))
+            self.sumsq = np.zeros(len(columns))
+            self.f = open(path, 'w+b')
+            self._update_header()
+        self.f.seek(0, os.SEEK_END)
+
+    def append(self, row):
+        """ Appends one sample, a value for every column. """
+        row = np.asarray(row, dtype=self.dtype).reshape(-1)
+        if len(row) != len(self.header['columns']):
+            raise ValueError(f"expected {len(self.header['columns'])} values, got {len(row)}")
+        self.extend(row[None])
+
+    def extend(self, rows):
+        """ Appends a block of samples, shape (n, n_columns). """
+        rows = np.ascontiguousarray(rows, dtype=self.dtype).reshape(-1, len(self.header['columns']))
+        self.f.write(rows.tobytes())
+        self.n_rows += len(rows)
+        self.sum += rows.sum(axis=0)
+        self.sumsq += (rows.astype(np.float64)**2).sum(axis=0)
+        self.n_pending += len(rows)
+        if self.n_pending >= self.flush_every:
+            self.flush()
+
+    def _update_header(self):
+        n = max(self.n_rows, 1)
+        mean = self.sum / n
+        self.header['mean'] = mean.tolist()
+        self.header['std'] = np.sqrt(np.maximum(self.sumsq / n - mean**2, 0)).tolist()
+        _write_header(self.f, self.header)
+        self.f.seek(0, os.SEEK_END)
+
+    def flush(self):
+        self._update_header()
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.n_pending = 0
+
+    def close(self):
+        if not self.f.closed:
+            self.flush()
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class Dataset:
+    """
+        Read access to a dataset file. `data` is a memory map of all rows, shape
+        (n_rows, n_columns), nothing is read until it is indexed. dataset['x']
+        is a view of one column. mode='r+' maps the file writable.
+    """
+    def __init__(self, path, mode='r'):
+        self.path = path
+        self.header = read_header(path)
+        self.columns = self.header['columns']
+        self.units = self.header['units']
+        self.mean = np.array(self.header['mean'])
+        self.std = np.array(self.header['std'])
+
+        n_rows = _n_rows(path, self.header)
+        shape = (n_rows, len(self.columns))
+        if n_rows == 0:
+            # An empty file cannot be memory mapped
+            self.data = np.empty(shape, dtype=self.header['dtype'])
+        else:
+            self.data = np.memmap(path, dtype=self.header['dtype'], mode=mode, offset=HEADER_SIZE, shape=shape)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, key):
+        # A column name or a list of them selects columns, anything else indexes the rows
+        if isinstance(key, str):
+            return self.data[:, self.columns.index(key)]
+        if isinstance(key, list) and key and isinstance(key[0], str):
+            return self.data[:, [self.columns.index(k) for k in key]]
+        return self.data[key]
+
+    def normalized(self, columns=None):
+        """ (data - mean) / std of the given columns (all by default), read into memory. """
+        idx = list(range(len(self.columns))) if columns is None else [self.columns.index(c) for c in columns]
+        return (self.data[:, idx] - self.mean[idx]) / self.std[idx]
+
+    def as_torch(self):
+        """
+            The rows as a torch tensor sharing memory with the file map (no copy).
+            torch warns about read-only arrays, open with mode='r+' to avoid it.
+        """
+        import torch
+        return torch.from_numpy(self.data)
+
+def from_csv(csv_path, path, layout=None, columns=None, units=None, delimiter=','):
+    """
+        Imports one of the recorded CSVs into a dataset file. The columns are named by
+        one of LAYOUTS ('center', 'diff', 'diffs'), so the file joins the sessions of
+        the matching collector, or given directly with columns and units.
+    """
+    if (layout is None) == (columns is None):
+        raise ValueError("give either a layout or the columns")
+    if layout is not None:
+        columns, units = LAYOUTS[layout]
+    data = np.loadtxt(csv_path, delimiter=delimiter, ndmin=2)
+    if data.shape[1] != len(columns):
+        raise ValueError(f"{csv_path} has {data.shape[1]} columns, expected {len(columns)} ({', '.join(columns)})")
+    with DatasetWriter(path, columns, units, flush_every=len(data)) as writer:
+        writer.extend(data)
+    return Dataset(path)
+
+def concatenate(paths, out_path):
+    """
+        Joins the dataset files of several sessions into one. The rows are copied
+        as raw bytes and the normalization constants are combined from those of
+        every file, nothing is parsed.
+    """
+    headers = [read_header(p) for p in paths]
+    for p, h in zip(paths[1:], headers[1:]):
+        if h['columns'] != headers[0]['columns'] or h['dtype'] != headers[0]['dtype']:
+            raise ValueError(f"columns or dtype of {p} do not match {paths[0]}")
+
+    n = np.array([_n_rows(p, h) for p, h in zip(paths, headers)], dtype=np.float64)
+    mean = np.array([h['mean'] for h in headers])
+    std = np.array([h['std'] for h in headers])
+    n_total = max(n.sum(), 1)
+    total_mean = n @ mean / n_total
+    total_var = n @ (std**2 + mean**2) / n_total - total_mean**2
+
+    header = dict(headers[0], mean=total_mean.tolist(), std=np.sqrt(np.maximum(total_var, 0)).tolist())
+    row_bytes = len(header['columns']) * np.dtype(header['dtype']).itemsize
+    with open(out_path, 'wb') as out:
+        _write_header(out, header)
+        out.seek(HEADER_SIZE)
+        for p, n_rows in zip(paths, n):
+            with open(p, 'rb') as f:
+                f.seek(HEADER_SIZE)
+                # Whole rows only, a partly written last row is left out
+                remaining = int(n_rows) * row_bytes
+                while remaining > 0:
+                    chunk = f.read(min(remaining, 1 << 20))
+                    out.write(chunk)
+                    remaining -= len(chunk)
+    return Dataset(out_path)
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import, join and inspect camera/joint dataset files")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('import', help="convert CSVs of one layout, data_center.csv -> data_center.dset")
+    p.add_argument('layout', choices=sorted(LAYOUTS))
+    p.add_argument('csv', nargs='+')
+    p = sub.add_parser('concat', help="join the datasets of several sessions")
+    p.add_argument('out')
+    p.add_argument('datasets', nargs='+')
+    p = sub.add_parser('info')
+    p.add_argument('datasets', nargs='+')
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        paths = [from_csv(c, os.path.splitext(c)[0] + '.dset', args.layout).path for c in args.csv]
+    elif args.command == 'concat':
+        paths = [concatenate(args.datasets, args.out).path]
+    else:
+        paths = args.datasets
+
+    for path in paths:
+        d = Dataset(path)
+        print(f"{path}: {len(d)} rows")
+        for c, u, m, s in zip(d.columns, d.units, d.mean, d.std):
+            print(f"  {c:>5} [{u}] mean {m:10.3f} std {s:10.3f}")
@@ -0,0 +1,63 @@
+import numpy as np
+
+class DelayLine:
+    """
+        Fixed size ring buffer delay line. Every push stores one sample of all channels,
+        read(lag) returns the sample pushed `lag` pushes ago (0 is the latest push).
+        Both are O(1) in the delay, nothing is shifted. Non-integer lags are linearly
+        interpolated between the two neighbouring samples.
+    """
+    def __init__(self, delay, n_channels=None, init=0, dtype=np.float64):
+        # n_channels: None for a scalar signal, an int or a shape for multi-channel samples
+        if delay < 0:
+            raise ValueError("delay must be non-negative")
+        self.delay = delay
+        self.size = int(np.ceil(delay)) + 1 # samples needed to read every lag up to delay
+
+        shape = () if n_channels is None else np.atleast_1d(n_channels).tolist()
+        self.buffer = np.empty([self.size] + list(shape), dtype=dtype)
+        self.buffer[...] = init # the history before the first push
+        self.head = 0 # row of the latest sample
+
+    def push(self, x):
+        self.head += 1
+        if self.head == self.size:
+            self.head = 0
+        self.buffer[self.head] = x
+
+    def read(self, lag=None):
+        # lag: a scalar, or an array broadcastable to the channel shape for a lag per channel
+        if lag is None:
+            lag = self.delay
+        if np.ndim(lag) > 0:
+            return self._read_lanes(np.asarray(lag))
+        if not 0 <= lag <= self.size - 1:
+            raise ValueError(f"lag must be between 0 and {self.size - 1}, got {lag}")
+
+        k = int(lag)
+        y = self.buffer[(self.head - k) % self.size]
+        frac = lag - k
+        if frac == 0:
+            return y.copy()
+        # Linear interpolation towards the next older sample
+        return (1 - frac)*y + frac*self.buffer[(self.head - k - 1) % self.size]
+
+    def _read_lanes(self, lag):
+        if lag.min() < 0 or lag.max() > self.size - 1:
+            raise ValueError(f"lags must be between 0 and {self.size - 1}")
+
+        shape = self.buffer.shape[1:]
+        k = np.broadcast_to(lag.astype(np.int64), shape)
+        y = np.take_along_axis(self.buffer, ((self.head - k) % self.size)[None], axis=0)[0]
+        frac = lag - k
+        if not frac.any():
+            return y
+        y_old = np.take_along_axis(self.buffer, ((self.head - k - 1) % self.size)[None], axis=0)[0]
+        return (1 - frac)*y + frac*y_old
+
+if __name__ == '__main__':
+    # Two channels delayed by 2.5 samples
+    d = DelayLine(2.5, 2)
+    for i in range(6):
+        d.push([i, 10*i])
+        print(i, d.read(0), d.read())
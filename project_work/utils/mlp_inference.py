@@ -0,0 +1,165 @@
+"""
+    NumPy forward pass of the trained torch MLPs (utils/torch_model.MLPNet and MLPtorch)
+    for the control loop, where one 2-vector goes through the network every step and
+    torch dispatch and tensor allocation cost more than the arithmetic.
+"""
+
+import pickle
+import zipfile
+import numpy as np
+
+# Layer names and hidden activations of the models in utils/torch_model.py
+ARCHITECTURES = {
+    'MLPNet': (['hidden1', 'hidden2', 'hidden3', 'predict'], ['leaky_relu', 'tanh', 'leaky_relu']),
+    'MLPtorch': (['fc1', 'fc2'], ['sigmoid']),
+}
+
+# Largest difference to the torch model, relative to the largest output. Both compute in float32
+# but sum the products in a different order, the outputs agree to float32 rounding and are not
+# bit identical. On trained_model_diff.pth NumpyMLP is 2.1e-6 from a float64 forward pass, eager
+# torch 3.4e-6, and the two differ by 2.9e-4 on outputs up to 140
+TORCH_RTOL = 1e-5
+
+# The activations work in place on a, tmp is a scratch buffer of the same shape, or None to allocate one
+def _leaky_relu(a, tmp=None):
+    # max(a, 0.01 a) is a for a >= 0 and 0.01 a below, torch's default negative slope
+    if tmp is None:
+        tmp = np.empty_like(a)
+    np.multiply(a, 0.01, out=tmp)
+    np.maximum(a, tmp, out=a)
+
+def _tanh(a, tmp=None):
+    np.tanh(a, out=a)
+
+def _sigmoid(a, tmp=None):
+    np.negative(a, out=a)
+    np.exp(a, out=a)
+    a += 1
+    np.reciprocal(a, out=a)
+
+ACTIVATIONS = {'leaky_relu': _leaky_relu, 'tanh': _tanh, 'sigmoid': _sigmoid}
+
+class _TorchUnpickler(pickle.Unpickler):
+    """ Rebuilds the tensors of a torch.save zip file as numpy arrays, without torch. """
+    DTYPES = {'FloatStorage': np.float32, 'DoubleStorage': np.float64, 'HalfStorage': np.float16,
+              'LongStorage': np.int64, 'IntStorage': np.int32, 'BoolStorage': np.bool_}
+
+    def __init__(self, f, archive, prefix):
+        super().__init__(f)
+        self.archive = archive
+        self.prefix = prefix
+
+    def find_class(self, module, name):
+        if module == 'torch._utils' and name == '_rebuild_tensor_v2':
+            return self._rebuild_tensor
+        if module == 'torch' and name in self.DTYPES:
+            return self.DTYPES[name]
+        if module == 'collections' and name == 'OrderedDict':
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError(f"{module}.{name} is not part of a plain state_dict")
+
+    def persistent_load(self, pid):
+        # ('storage', dtype, key, location, numel)
+        _, dtype, key, _, numel = pid
+        raw = self.archive.read(f'{self.prefix}/data/{key}')
+        return np.frombuffer(raw, dtype=np.dtype(dtype).newbyteorder('<'), count=numel)
+
+    @staticmethod
+    def _rebuild_tensor(storage, offset, size, stride, *args):
+        itemsize = storage.itemsize
+        return np.lib.stride_tricks.as_strided(storage[offset:], shape=size,
+                                               strides=[s * itemsize for s in stride]).copy()
+
+def read_torch_file(path):
+    """
+        The object saved in a torch.save file with every tensor as a numpy array, torch is
+        not needed. Only tensors, OrderedDicts and plain python values can be read.
+    """
+    with zipfile.ZipFile(path) as archive:
+        pkl = next(n for n in archive.namelist() if n.endswith('/data.pkl'))
+        with archive.open(pkl) as f:
+            return _TorchUnpickler(f, archive, pkl[:-len('/data.pkl')]).load()
+
+def read_state_dict(path):
+    """ The state_dict of a torch.save file as a dict of numpy arrays, torch is not needed. """
+    return dict(read_torch_file(path))
+
+class NumpyMLP:
+    """
+        Forward pass of a fully connected network with preallocated buffers. Layer i computes
+        f_i(W_i x + b_i), the last layer is linear, the same as the torch models.
+
+        For a single input vector the layer outputs are written into buffers made once
+        here, batches (n, n_in) fall back to ordinary matrix products. float32 by default,
+        the precision torch computes in. The outputs match the torch model to float32 rounding,
+        within TORCH_RTOL times the largest output, not bit for bit.
+    """
+    def __init__(self, weights, biases, activations, dtype=np.float32):
+        # weights: (n_out, n_in) matrices as in torch.nn.Linear, activations: one name per hidden layer
+        if len(activations) != len(weights) - 1:
+            raise ValueError("one activation per hidden layer is needed")
+        self.dtype = np.dtype(dtype)
+        self.weights = [np.ascontiguousarray(W, dtype=self.dtype) for W in weights]
+        self.biases = [np.ascontiguousarray(b, dtype=self.dtype) for b in biases]
+        self.activations = [ACTIVATIONS[a] for a in activations] + [None]
+        self.n_inputs = self.weights[0].shape[1]
+        self.n_outputs = self.weights[-1].shape[0]
+
+        self._x = np.zeros(self.n_inputs, dtype=self.dtype)
+        self._buffers = [np.zeros(len(b), dtype=self.dtype) for b in self.biases]
+        self._scratch = [np.zeros(len(b), dtype=self.dtype) for b in self.biases]
+
+    @classmethod
+    def from_state_dict(cls, state, architecture=None, dtype=np.float32):
+        """
+            Builds the network from a state_dict (torch tensors or numpy arrays) of one of
+            ARCHITECTURES, found from the layer names if not given.
+        """
+        if architecture is None:
+            architecture = next((a for a, (layers, _) in ARCHITECTURES.items()
+                                 if all(f'{l}.weight' in state for l in layers)), None)
+            if architecture is None:
+                raise ValueError(f"unknown architecture, layers {sorted(state)}")
+        layers, activations = ARCHITECTURES[architecture]
+        as_numpy = lambda t: t.detach().cpu().numpy() if hasattr(t, 'detach') else np.asarray(t)
+        return cls([as_numpy(state[f'{l}.weight']) for l in layers],
+                   [as_numpy(state[f'{l}.bias']) for l in layers], activations, dtype)
+
+    @classmethod
+    def from_file(cls, path, architecture=None, dtype=np.float32):
+        """ Builds the network from a torch.save'd state_dict, without importing torch. """
+        return cls.from_state_dict(read_state_dict(path), architecture, dtype)
+
+    def __call__(self, x):
+        x = np.asarray(x)
+        if x.ndim > 1:
+            return self.predict_batch(x)
+        self._x[:] = x
+        h = self._x
+        for W, b, f, out, tmp in zip(self.weights, self.biases, self.activations, self._buffers, self._scratch):
+            np.dot(W, h, out=out)
+            out += b
+            if f is not None:
+                f(out, tmp)
+            h = out
+        # A copy, the buffer is overwritten by the next call
+        return h.copy()
+
+    def predict_batch(self, x):
+        """ Outputs of a batch of inputs, shape (n, n_inputs) -> (n, n_outputs). """
+        h = np.asarray(x, dtype=self.dtype)
+        for W, b, f in zip(self.weights, self.biases, self.activations):
+            h = h @ W.T + b
+            if f is not None:
+                f(h)
+        return h
+
+def freeze_torchscript(model, n_inputs=2):
+    """ The torch model scripted and frozen for inference, the torch alternative to NumpyMLP. """
+    import torch
+    model.eval()
+    scripted = torch.jit.freeze(torch.jit.script(model))
+    # Run it once so the optimizations are done before the control loop starts
+    with torch.no_grad():
+        scripted(torch.zeros(n_inputs))
+    return scripted
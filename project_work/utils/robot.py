@@ -1,7 +1,13 @@
 import numpy as np
+from scipy.integrate import solve_ivp
 
 class SingleLink:
-    def __init__(self, dt):
+    def __init__(self, dt, integrator='euler', n_substeps=None):
+        """
+            integrator: 'euler' (forward Euler), 'semi-implicit' (semi-implicit/symplectic Euler),
+                        'rk4' or 'adaptive' (scipy RK45 with error control over the whole dt)
+            n_substeps: fixed number of integration steps per call of step, by default dt/1ms
+        """
         self.theta = 0
         self.omega = 0
 
@@ -18,19 +24,94 @@ class SingleLink:
             self.sim_step = dt
         self.dt = dt # time step of step function
 
+        # Integer sub-step count, so float accumulation of t cannot add or drop a sub-step
+        if n_substeps is None:
+            n_substeps = max(1, int(round(dt/self.sim_step)))
+        self.n_substeps = n_substeps
+        self.sim_step = dt/n_substeps
+
+        integrators = {'euler': self._euler, 'semi-implicit': self._semi_implicit_euler, 'rk4': self._rk4, 'adaptive': None}
+        if integrator not in integrators:
+            raise ValueError(f"integrator must be one of {list(integrators)}")
+        self.integrator = integrator
+        self._integrate = integrators[integrator]
+
+        self.rtol = 1e-6 # tolerances of the adaptive solver
+        self.atol = 1e-9
+
     def step(self, tau):
-        t = 0
-        while t < self.dt:
-            alpha = (tau - self.b*self.omega - self.g) / self.I
+        if self.integrator == 'adaptive':
+            self._adaptive(tau)
+            return
+
+        for _ in range(self.n_substeps):
+            self._integrate(tau, self.sim_step)
+
+    def dynamics(self, theta, omega, tau):
+        """ Returns the derivatives of theta and omega """
+        alpha = (tau - self.b*omega - self.m*self.g_const*(0.5*self.l)*np.cos(theta)) / self.I
+        return omega, alpha
+
+    def _euler(self, tau, h):
+        _, alpha = self.dynamics(self.theta, self.omega, tau)
+
+        self.theta += self.omega*h
+        self.omega +=      alpha*h
+
+    def _semi_implicit_euler(self, tau, h):
+        _, alpha = self.dynamics(self.theta, self.omega, tau)
+
+        self.omega += alpha*h
+        self.theta += self.omega*h # uses the updated velocity
+
+    def _rk4(self, tau, h):
+        th, om = self.theta, self.omega
+        k1 = self.dynamics(th, om, tau)
+        k2 = self.dynamics(th + 0.5*h*k1[0], om + 0.5*h*k1[1], tau)
+        k3 = self.dynamics(th + 0.5*h*k2[0], om + 0.5*h*k2[1], tau)
+        k4 = self.dynamics(th + h*k3[0], om + h*k3[1], tau)
 
-            self.theta += self.omega*self.sim_step
-            self.omega +=      alpha*self.sim_step
-            t += self.sim_step
+        self.theta = th + h/6*(k1[0] + 2*k2[0] + 2*k3[0] + k4[0])
+        self.omega = om + h/6*(k1[1] + 2*k2[1] + 2*k3[1] + k4[1])
+
+    def _adaptive(self, tau):
+        shape = np.shape(self.theta)
+        n = int(np.prod(shape))
+        tau = np.broadcast_to(tau, shape).ravel()
+
+        def f(t, y):
+            return np.concatenate(self.dynamics(y[:n], y[n:], tau))
+
+        y0 = np.concatenate([np.ravel(self.theta), np.ravel(self.omega)]).astype(float)
+        y = solve_ivp(f, (0, self.dt), y0, rtol=self.rtol, atol=self.atol).y[:, -1]
+
+        self.theta = y[:n].reshape(shape) if shape else y[0]
+        self.omega = y[n:].reshape(shape) if shape else y[1]
 
     @property
     def g(self):
         return self.m*self.g_const*(0.5*self.l)*np.cos(self.theta)
 
+class SingleLinkBatch(SingleLink):
+    def __init__(self, dt, n_links, m=0.25, l=1.0, b=5, integrator='euler', n_substeps=None):
+        """
+            n_links independent single links stepped together, theta/omega are arrays of length n_links
+            and step takes an array of n_links torques (or one torque for all).
+            m, l and b can be given per link (arrays of length n_links) or as one value for all.
+        """
+        super().__init__(dt, integrator, n_substeps)
+        self.n_links = n_links
+
+        self.theta = np.zeros(n_links)
+        self.omega = np.zeros(n_links)
+
+        self.m = np.broadcast_to(np.asarray(m, dtype=float), (n_links,)).copy() # link masses
+        self.l = np.broadcast_to(np.asarray(l, dtype=float), (n_links,)).copy() # link lengths
+        self.I = 1/3*self.m*self.l**2 # link inertias, rods
+
+        self.b = np.broadcast_to(np.asarray(b, dtype=float), (n_links,)).copy()
+
+
 if __name__ == '__main__':
     r = SingleLink(1e-3)
 
@@ -0,0 +1,112 @@
+import numpy as np
+import torch
+from torch.utils.data import TensorDataset, DataLoader, BatchSampler, SequentialSampler
+
+def train_val_split(x, y, val_fraction=0.2, seed=0):
+    """ Random split of the examples into (x_train, y_train, x_val, y_val). """
+    # Generator and permutation on the CPU, also when the scripts set CUDA as the default tensor type
+    g = torch.Generator(device='cpu').manual_seed(seed)
+    order = torch.randperm(len(x), generator=g, device='cpu').to(x.device)
+    n_val = int(round(val_fraction * len(x)))
+    val, train = order[:n_val], order[n_val:]
+    return x[train], y[train], x[val], y[val]
+
+class Trainer:
+    """
+        Trains a torch model (utils/torch_model.MLPNet or any nn.Module) on (x, y)
+        with the optimizer, loss and optional scheduler of the calling script.
+
+        batch_size: examples per optimizer step, None for one full batch step per epoch
+        eval_every: epochs between validation passes, the losses are only copied
+                    back from the device then, not every step
+        patience:   stop after this many validation passes without improving the
+                    best validation loss by more than min_delta, None to never stop early
+        checkpoint_path: the state_dict of the best model so far is saved here
+    """
+    def __init__(self, model, optimizer, loss_func=None, scheduler=None, batch_size=None, shuffle=True,
+                 eval_every=10, patience=None, min_delta=0.0, checkpoint_path=None, seed=0):
+        self.model = model
+        self.optimizer = optimizer
+        self.loss_func = torch.nn.MSELoss() if loss_func is None else loss_func
+        self.scheduler = scheduler
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.eval_every = eval_every
+        self.patience = patience
+        self.min_delta = min_delta
+        self.checkpoint_path = checkpoint_path
+        self.generator = torch.Generator(device='cpu').manual_seed(seed)
+
+    def batches(self, x, y):
+        """ DataLoader over (x, y). Each batch is one indexing of the tensors, not batch_size single examples collated. """
+        if self.batch_size is None:
+            return [(x, y)]
+        dataset = TensorDataset(x, y)
+        # RandomSampler draws on the default device, so the epoch order is drawn here on the CPU
+        sampler = torch.randperm(len(x), generator=self.generator, device='cpu').tolist() if self.shuffle else SequentialSampler(dataset)
+        return DataLoader(dataset, sampler=BatchSampler(sampler, self.batch_size, drop_last=False), batch_size=None)
+
+    def evaluate(self, x, y):
+        """ Loss over (x, y) without gradients, as a 0-dim tensor on the device. """
+        self.model.eval()
+        with torch.no_grad():
+            loss = self.loss_func(self.model(x), y)
+        self.model.train()
+        return loss
+
+    def fit(self, x, y, num_epochs, x_val=None, y_val=None, progress=False):
+        """
+            Train for up to num_epochs epochs. Early stopping and checkpointing watch
+            the validation loss, or the training loss if no validation set is given.
+            The best weights are loaded back into the model at the end.
+
+            Returns a dict of numpy arrays: 'train_loss' (mean over the batches of every
+            epoch run), and the 'eval_epoch' and 'val_loss' of every validation pass.
+        """
+        if x_val is None:
+            x_val, y_val = x, y
+        train_loss = []
+        val_loss, eval_epoch = [], []
+        best_loss = np.inf
+        best_state = {k: v.detach().clone() for k, v in self.model.state_dict().items()}
+        n_bad = 0
+
+        epochs = range(num_epochs)
+        if progress:
+            from tqdm import tqdm
+            epochs = tqdm(epochs)
+
+        self.model.train()
+        for epoch in epochs:
+            epoch_loss = torch.zeros((), device=x.device)
+            for xb, yb in self.batches(x, y):
+                prediction = self.model(xb)
+                loss = self.loss_func(prediction, yb)
+                self.optimizer.zero_grad()
+                loss.backward()
+                self.optimizer.step()
+                # Summed on the device, nothing waits for the step to finish
+                epoch_loss += loss.detach() * len(xb)
+            if self.scheduler is not None:
+                self.scheduler.step()
+            train_loss.append(epoch_loss / len(x))
+
+            if (epoch + 1) % self.eval_every == 0 or epoch == num_epochs - 1:
+                # The only device to host copy of the pass
+                loss = self.evaluate(x_val, y_val).item()
+                val_loss.append(loss)
+                eval_epoch.append(epoch)
+                if loss < best_loss - self.min_delta:
+                    best_loss = loss
+                    best_state = {k: v.detach().clone() for k, v in self.model.state_dict().items()}
+                    if self.checkpoint_path is not None:
+                        torch.save(best_state, self.checkpoint_path)
+                    n_bad = 0
+                else:
+                    n_bad += 1
+                    if self.patience is not None and n_bad >= self.patience:
+                        break
+
+        self.model.load_state_dict(best_state)
+        return {'train_loss': torch.stack(train_loss).cpu().numpy(),
+                'eval_epoch': np.array(eval_epoch), 'val_loss': np.array(val_loss)}
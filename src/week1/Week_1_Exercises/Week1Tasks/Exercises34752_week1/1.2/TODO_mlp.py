@@ -1,6 +1,5 @@
 import numpy as np
 
-from perceptron import Perceptron
 from activation import ActivationFunction
 
 """
@@ -47,51 +46,56 @@ class LinearActivation(ActivationFunction):
 class Layer:
     def __init__(self, num_inputs, num_units, act_f):
         """
-        Initialize the layer, creating `num_units` perceptrons with `num_inputs` each.
+        Initialize the layer of `num_units` units with `num_inputs` inputs each.
+        The weights of all units are one matrix, column i holding the weights (bias first) of unit i.
         """
-        #   TODO Create the perceptrons required for the layer
+        if not isinstance(act_f, type) or not issubclass(act_f, ActivationFunction):
+            raise TypeError(
+                "act_f has to be a subclass of ActivationFunction (not a class instance)."
+            )
+        self.num_inputs = num_inputs
         self.num_units = num_units
-        self.ps = [Perceptron(num_inputs, act_f) for _ in range(num_units)]
+        # Same draws as creating num_units Perceptrons one after the other
+        self.W = np.random.normal(0, 1, size=(num_units, num_inputs + 1)).T.copy()
+        self.f = act_f()
 
     def activation(self, x):
-        """Returns the activation `a` of all perceptrons in the layer, given the input vector`x`."""
-        return np.array([p.activation(x) for p in self.ps])
+        """Returns the activation `a` of all units in the layer, given the input vector `x` (or a batch of them, one per row)."""
+        return x @ self.W[1:] + self.W[0]
 
     def output(self, a):
-        """Returns the output `o` of all perceptrons in the layer, given the activation vector `a`."""
-        return np.array([p.output(ai) for p, ai in zip(self.ps, a)])
+        """Returns the output `o` of all units in the layer, given the activation vector `a` (or a batch)."""
+        return self.f.forward(a)
 
     def predict(self, x):
-        """Returns the output `o` of all perceptrons in the layer, given the input vector `x`."""
-        return np.array([p.predict(x) for p in self.ps])
+        """Returns the output `o` of all units in the layer, given the input vector `x` (or a batch)."""
+        return self.output(self.activation(x))
 
     def gradient(self, a):
-        """Returns the gradient of the activation function for all perceptrons in the layer, given the activation vector `a`."""
-        return np.array([p.gradient(ai) for p, ai in zip(self.ps, a)])
+        """Returns the gradient of the activation function for all units in the layer, given the activation vector `a` (or a batch)."""
+        return self.f.gradient(a)
 
     def update_weights(self, dw):
         """
-        Update the weights of all of the perceptrons in the layer, given the weight change of each.
+        Update the weights of all of the units in the layer, given the weight change of each.
         Input size: (n_inputs+1, n_units)
         """
-        for i in range(self.num_units):
-            self.ps[i].w += dw[:, i]
+        self.W += dw
 
     @property
     def w(self):
         """
-        Returns the weights of the neurons in the layer.
+        Returns a copy of the weights of the units in the layer, later updates do not change it.
         Size: (n_inputs+1, n_units)
         """
-        return np.array([p.w for p in self.ps]).T
+        return self.W.copy()
 
     def import_weights(self, w):
         """
-        Import the weights of all of the perceptrons in the layer.
+        Import the weights of all of the units in the layer.
         Input size: (n_inputs+1, n_units)
         """
-        for i in range(self.num_units):
-            self.ps[i].w = w[:, i]
+        self.W = np.array(w, dtype=np.float64).reshape(self.num_inputs + 1, self.num_units)
 
 
 class MLP:
@@ -123,23 +127,39 @@ class MLP:
 
     def predict(self, x):
         """
-        Forward pass prediction given the input x
-        TODO: Write the function
+        Forward pass prediction given the inputs x (size: n_examples, n_inputs)
+        Returns the outputs (size: n_examples, n_outputs)
+        """
+        o1 = self.l1.predict(np.asarray(x, dtype=np.float64))
+        return self.l_out.predict(o1)
+
+    def gradients(self, inputs, outputs):
+        """
+        Backward pass over a batch of examples.
+        Returns the weight gradients of the squared error summed over the batch,
+        ΔW1: (I+1, H) and ΔWout: (H+1, O), the shapes Layer.update_weights expects.
         """
-        preds = []
-        for inp in x:
-            # Forward pass through the hidden layer
-            a = self.l1.activation(inp)
-            a = self.l1.output(a)
-            # Forward pass through the output layer
-            a = self.l_out.activation(a)
-            a = self.l_out.output(a)
-            preds.append(a)
-        return np.array(preds)
+        x = np.asarray(inputs, dtype=np.float64)
+        t = np.asarray(outputs, dtype=np.float64).reshape(len(x), self.n_outputs)
+
+        # Forward pass
+        a1 = self.l1.activation(x)            # (N, H)
+        o1 = self.l1.output(a1)               # (N, H)
+        a2 = self.l_out.activation(o1)        # (N, O)
+        y  = self.l_out.output(a2)            # (N, O)
+
+        # Deltas (use Eq. 7 for sign: δ = f'(a) * (y - t))
+        delta_out = self.l_out.gradient(a2) * (y - t)                   # (N, O)
+        delta1    = self.l1.gradient(a1) * (delta_out @ self.l_out.W[1:, :].T)  # (N, H)
+
+        # The bias row is the sum of the deltas (its input is always 1)
+        dW1    = np.vstack((delta1.sum(axis=0), x.T @ delta1))         # (I+1, H)
+        dW_out = np.vstack((delta_out.sum(axis=0), o1.T @ delta_out))  # (H+1, O)
+        return dW1, dW_out
 
     def train(self, inputs, outputs):
         """
-           Train the network
+           Train the network, one full batch gradient descent step
 
         Parameters
         ----------
@@ -147,59 +167,34 @@ class MLP:
            Inputs (size: n_examples, n_inputs)
         `t` : numpy array
            Targets (size: n_examples, n_outputs)
-
-        TODO: Write the function to iterate through training examples and apply gradient descent to update the neuron weights
         """
-
-        # Loop over training examples
         N = len(inputs)
-        dW1    = np.zeros((self.num_inputs + 1, self.n_hidden_units))
-        dW_out = np.zeros((self.n_hidden_units + 1, self.n_outputs))
-        for inp, target in zip(inputs, outputs):
-            # Forward pass
-            a1 = self.l1.activation(inp)          # (H,)
-            o1 = self.l1.output(a1)               # (H,)
-            a2 = self.l_out.activation(o1)        # (O,)
-            y  = self.l_out.output(a2)            # (O,)
-
-            # Deltas (use Eq. 7 for sign: δ = f'(a) * (y - t))
-            delta_out = self.l_out.gradient(a2) * (y - target)             # (O,)
-            delta1    = self.l1.gradient(a1) * (self.l_out.w[1:, :] @ delta_out)  # (H,)
-
-            # Build augmented inputs/outputs to include bias 1
-            o0_aug = np.concatenate(([1.0], inp))   # (I+1,)
-            o1_aug = np.concatenate(([1.0], o1))    # (H+1,)
-
-            # Accumulate ΔW with shapes that match Layer.update_weights:
-            #   ΔW1: (I+1, H) ;  ΔWout: (H+1, O)
-            dW1      += np.outer(o0_aug, delta1)        # (I+1, H)
-            dW_out   += np.outer(o1_aug, delta_out)     # (H+1, O)
-
+        dW1, dW_out = self.gradients(inputs, outputs)
 
         # Update weights
         self.l1.update_weights(-self.alpha / N * dW1)
         self.l_out.update_weights(-self.alpha / N * dW_out)
-            # Reset temporary arrays
-        return None  # remove this line
 
     def export_weights(self):
         return [self.l1.w, self.l_out.w]
 
     def import_weights(self, ws):
-        if ws[0].shape == (self.l1.n_units, self.n_inputs + 1) and ws[1].shape == (
-            self.l2.n_units,
-            self.l1.n_units + 1,
+        if ws[0].shape == (self.num_inputs + 1, self.l1.num_units) and ws[1].shape == (
+            self.l1.num_units + 1,
+            self.l_out.num_units,
         ):
             print("Importing weights..")
             self.l1.import_weights(ws[0])
-            self.l2.import_weights(ws[1])
+            self.l_out.import_weights(ws[1])
         else:
             print("Sizes do not match")
 
 
 def calc_prediction_error(model, x, t):
     """Calculate the average prediction error"""
-    return np.mean((model.predict(x) - t)**2)
+    y = model.predict(x)
+    # Targets of a single output network may come as (N,), compare them as (N, 1)
+    return np.mean((y - np.asarray(t, dtype=np.float64).reshape(y.shape))**2)
 
 
 
@@ -0,0 +1,63 @@
+import time
+import numpy as np
+
+from perceptron import Perceptron
+from TODO_mlp import MLP, Sigmoid, LinearActivation
+
+class PerceptronMLP:
+    """ Reference: the per perceptron, per example MLP.train that Layer/MLP replaced """
+    def __init__(self, model):
+        self.alpha = model.alpha
+        self.l1 = [Perceptron(model.num_inputs, Sigmoid) for _ in range(model.n_hidden_units)]
+        self.l_out = [Perceptron(model.n_hidden_units, LinearActivation) for _ in range(model.n_outputs)]
+        for ps, w in zip([self.l1, self.l_out], model.export_weights()):
+            for i, p in enumerate(ps):
+                p.w = w[:, i].copy()
+
+    def train(self, inputs, outputs):
+        w_out = lambda: np.array([p.w for p in self.l_out]).T
+        dW1 = np.zeros((len(self.l1[0].w), len(self.l1)))
+        dW_out = np.zeros((len(self.l_out[0].w), len(self.l_out)))
+        for inp, target in zip(inputs, outputs):
+            a1 = np.array([p.activation(inp) for p in self.l1])
+            o1 = np.array([p.output(a) for p, a in zip(self.l1, a1)])
+            a2 = np.array([p.activation(o1) for p in self.l_out])
+            y = np.array([p.output(a) for p, a in zip(self.l_out, a2)])
+
+            delta_out = np.array([p.gradient(a) for p, a in zip(self.l_out, a2)]) * (y - target)
+            delta1 = np.array([p.gradient(a) for p, a in zip(self.l1, a1)]) * (w_out()[1:, :] @ delta_out)
+
+            dW1 += np.outer(np.concatenate(([1.0], inp)), delta1)
+            dW_out += np.outer(np.concatenate(([1.0], o1)), delta_out)
+
+        for ps, dW in zip([self.l1, self.l_out], [dW1, dW_out]):
+            for i, p in enumerate(ps):
+                p.w += -self.alpha / len(inputs) * dW[:, i]
+
+    def export_weights(self):
+        return [np.array([p.w for p in ps]).T for ps in [self.l1, self.l_out]]
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    N = 200 # examples per epoch
+
+    print(f"{'hidden':>6} {'perceptrons [ms/epoch]':>23} {'matrix [ms/epoch]':>18} {'speedup':>8} {'max |dW|':>10}")
+    for H in [3, 16, 64, 256]:
+        x = rng.normal(size=(N, 2))
+        t = rng.normal(size=(N, 2))
+        model = MLP(2, H, 2, alpha=0.1)
+        ref = PerceptronMLP(model)
+
+        n_ref = 3
+        t0 = time.perf_counter()
+        for _ in range(n_ref):
+            ref.train(x, t)
+        t_ref = (time.perf_counter() - t0)/n_ref
+
+        t0 = time.perf_counter()
+        for _ in range(n_ref):
+            model.train(x, t)
+        t_mat = (time.perf_counter() - t0)/n_ref
+
+        dW = max(np.abs(a - b).max() for a, b in zip(model.export_weights(), ref.export_weights()))
+        print(f"{H:>6} {t_ref*1e3:>23.2f} {t_mat*1e3:>18.3f} {t_ref/t_mat:>8.0f} {dW:>10.1e}")
@@ -0,0 +1,185 @@
+import numpy as np
+
+from TODO_mlp import MLP, calc_prediction_error
+
+
+def chunked_prediction_error(model, x, t, chunk_size=65536):
+    """
+    calc_prediction_error over the dataset in chunks of rows, so memory mapped
+    arrays are never read into memory all at once.
+    """
+    total = 0.0
+    for start in range(0, len(x), chunk_size):
+        xb = np.asarray(x[start:start + chunk_size])
+        total += calc_prediction_error(model, xb, t[start:start + chunk_size]) * len(xb)
+    return total / len(x)
+
+
+class Trainer:
+    """
+       Mini-batch trainer for the MLP of TODO_mlp.py
+
+    Parameters
+    ----------
+    model : MLP
+       The network to train, its weights are updated in place
+    batch_size : int
+       Examples per weight update, None for full batch
+    shuffle : bool
+       Draw the batches in a new random order every epoch
+    optimizer : str
+       'sgd', 'momentum' or 'adam'
+    alpha : float
+       Learning rate, model.alpha if None
+    momentum : float
+       Velocity decay of the 'momentum' optimizer
+    beta1, beta2, eps : float
+       Adam moment decays and denominator offset
+    patience : int
+       Stop after this many epochs without the validation error improving
+       by more than min_delta, None to always run every epoch
+    """
+
+    def __init__(self, model, batch_size=32, shuffle=True, optimizer='sgd', alpha=None, momentum=0.9,
+                 beta1=0.9, beta2=0.999, eps=1e-8, patience=None, min_delta=0.0, seed=None):
+        if optimizer not in ('sgd', 'momentum', 'adam'):
+            raise ValueError(f"Unknown optimizer {optimizer!r}, use 'sgd', 'momentum' or 'adam'")
+        self.model = model
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.optimizer = optimizer
+        self.alpha = model.alpha if alpha is None else alpha
+        self.momentum = momentum
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.eps = eps
+        self.patience = patience
+        self.min_delta = min_delta
+        self.rng = np.random.default_rng(seed)
+
+        # Optimizer state, one entry per layer
+        self.layers = [model.l1, model.l_out]
+        self.m = [np.zeros_like(l.w) for l in self.layers]  # velocity / Adam first moment
+        self.v = [np.zeros_like(l.w) for l in self.layers]  # Adam second moment
+        self.n_steps = 0
+
+    def step(self, x, t):
+        """One weight update from the batch x (size: n_examples, n_inputs), t (size: n_examples, n_outputs)."""
+        grads = self.model.gradients(x, t)
+        self.n_steps += 1
+        for i, (layer, g) in enumerate(zip(self.layers, grads)):
+            g = g / len(x)  # mean gradient, like MLP.train
+            if self.optimizer == 'sgd':
+                dw = -self.alpha * g
+            elif self.optimizer == 'momentum':
+                self.m[i] = self.momentum * self.m[i] - self.alpha * g
+                dw = self.m[i]
+            else:
+                self.m[i] = self.beta1 * self.m[i] + (1 - self.beta1) * g
+                self.v[i] = self.beta2 * self.v[i] + (1 - self.beta2) * g**2
+                m_hat = self.m[i] / (1 - self.beta1**self.n_steps)
+                v_hat = self.v[i] / (1 - self.beta2**self.n_steps)
+                dw = -self.alpha * m_hat / (np.sqrt(v_hat) + self.eps)
+            layer.update_weights(dw)
+
+    def batches(self, n):
+        """Row indices of the batches of one epoch over n examples."""
+        batch_size = n if self.batch_size is None else self.batch_size
+        order = self.rng.permutation(n) if self.shuffle else np.arange(n)
+        for start in range(0, n, batch_size):
+            # Sorted rows read a memory mapped file front to back
+            yield np.sort(order[start:start + batch_size])
+
+    def fit(self, x, t, epochs, x_val=None, t_val=None, verbose=False):
+        """
+           Train for up to `epochs` epochs
+
+        x, t can be numpy arrays or memory mapped arrays (np.load(..., mmap_mode='r')),
+        only one batch of rows is read at a time. Early stopping watches the error on
+        x_val, t_val, or on the training data if no validation set is given, and the
+        weights of the best epoch are restored at the end.
+
+        Returns a dict with the 'train_error' and 'val_error' of every epoch run
+        and the 'best_epoch'.
+        """
+        if x_val is None:
+            x_val, t_val = x, t
+        hist = {'train_error': [], 'val_error': [], 'best_epoch': 0}
+        best_error = np.inf
+        best_weights = self.model.export_weights()
+        epochs_without_improvement = 0
+
+        for epoch in range(epochs):
+            total, n = 0.0, 0
+            for idx in self.batches(len(x)):
+                xb = np.asarray(x[idx], dtype=np.float64)
+                tb = np.asarray(t[idx], dtype=np.float64)
+                self.step(xb, tb)
+                # Training error of the batch just after its update, cheaper than another pass
+                total += calc_prediction_error(self.model, xb, tb) * len(idx)
+                n += len(idx)
+            hist['train_error'].append(total / n)
+            val_error = chunked_prediction_error(self.model, x_val, t_val)
+            hist['val_error'].append(val_error)
+            if verbose:
+                print(f"Epoch {epoch}, train error: {total / n:.5f}, val error: {val_error:.5f}")
+
+            if val_error < best_error - self.min_delta:
+                best_error = val_error
+                best_weights = self.model.export_weights()
+                hist['best_epoch'] = epoch
+                epochs_without_improvement = 0
+            else:
+                epochs_without_improvement += 1
+                if self.patience is not None and epochs_without_improvement >= self.patience:
+                    break
+
+        self.model.l1.import_weights(best_weights[0])
+        self.model.l_out.import_weights(best_weights[1])
+        return hist
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+    import time
+    from pathlib import Path
+
+    parser = argparse.ArgumentParser(description="Train the NumPy MLP on recorded camera/joint data (joint angles first, pixel position last)")
+    parser.add_argument("csv", nargs="+", help="data_*.csv files from project_work/MLP")
+    parser.add_argument("--hidden", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--optimizer", default="adam", choices=["sgd", "momentum", "adam"])
+    parser.add_argument("--alpha", type=float, default=1e-3)
+    parser.add_argument("--epochs", type=int, default=200)
+    parser.add_argument("--patience", type=int, default=20)
+    parser.add_argument("--memmap", action="store_true", help="train from a memory mapped copy of the data")
+    args = parser.parse_args()
+
+    data = np.concatenate([np.loadtxt(f, delimiter=",", ndmin=2) for f in args.csv])
+
+    # Pixel position in, joint angles out, both normalized to zero mean and unit variance
+    x_mean, x_std = data[:, -2:].mean(axis=0), data[:, -2:].std(axis=0)
+    t_mean, t_std = data[:, :-2].mean(axis=0), data[:, :-2].std(axis=0)
+    x = (data[:, -2:] - x_mean) / x_std
+    t = (data[:, :-2] - t_mean) / t_std
+
+    rng = np.random.default_rng(0)
+    val = rng.random(len(x)) < 0.2
+    x_train, t_train, x_val, t_val = x[~val], t[~val], x[val], t[val]
+    if args.memmap:
+        tmp = Path(tempfile.mkdtemp())
+        np.save(tmp / "x.npy", x_train)
+        np.save(tmp / "t.npy", t_train)
+        x_train, t_train = np.load(tmp / "x.npy", mmap_mode="r"), np.load(tmp / "t.npy", mmap_mode="r")
+
+    model = MLP(num_inputs=2, n_hidden_units=args.hidden, n_outputs=t.shape[1])
+    trainer = Trainer(model, batch_size=args.batch_size, optimizer=args.optimizer, alpha=args.alpha,
+                      patience=args.patience, seed=0)
+
+    t0 = time.perf_counter()
+    hist = trainer.fit(x_train, t_train, args.epochs, x_val, t_val)
+    print(f"{len(hist['val_error'])} epochs in {time.perf_counter() - t0:.1f} s, "
+          f"best epoch {hist['best_epoch']}, val error {min(hist['val_error']):.4f} (normalized)")
+    rmse = np.sqrt(np.mean((model.predict(x_val) - t_val)**2, axis=0)) * t_std
+    print(f"Joint angle RMSE: {rmse}")
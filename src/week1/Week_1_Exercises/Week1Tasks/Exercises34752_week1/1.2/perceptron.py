@@ -22,7 +22,8 @@ class SignActivation(ActivationFunction):
     """
 
     def forward(self, x):
-        return 1 if x > 0 else 0
+        # Scalars give a scalar, arrays (a whole layer or batch) are thresholded elementwise
+        return np.where(np.asarray(x) > 0, 1, 0)[()]
 
     def gradient(self, x):
         """
@@ -3,6 +3,8 @@ from enum import Enum
 import numpy as np
 import matplotlib.pyplot as plt
 
+import spike_analysis
+
 #region Constants
 Rm = 10*1e6  # Mega Ohm
 Cm = 1*1e-9  # Nano Farad
@@ -51,11 +53,7 @@ class Neuron:
         Finds the indices of spikes in the membrane potential time series.
         A spike is defined as a local maximum in the membrane potential.
         """
-        spikes = []
-        for i in range(1, len(membrane_potential) - 1):
-            if membrane_potential[i-1] < membrane_potential[i] > membrane_potential[i+1]:
-                spikes.append(i)
-        return spikes
+        return spike_analysis.find_spikes(membrane_potential)
 
     @staticmethod
     def calculate_spiking_frequency(spike_indices: list, delta_t: float) -> float:
@@ -70,11 +68,7 @@ class Neuron:
         frequency : float
             Spiking frequency in Hz.
         """
-        if len(spike_indices) < 2:
-            return 0.0
-        isi = np.diff(spike_indices) * delta_t  # Interspike intervals in seconds
-        avg_isi = np.mean(isi)
-        return 1.0 / avg_isi if avg_isi > 0 else 0.0
+        return spike_analysis.spiking_frequency(spike_indices, delta_t)
         
     def update_state(self, state : NeuronState):
         """
@@ -171,7 +165,6 @@ class Neuron:
         
         
         plt.figure(figsize=(10,5))
-        time_points = np.arange(0, len(membrane_potential) * DT, DT)
 
         # Define colors for each state
         state_colors = {
@@ -181,15 +174,11 @@ class Neuron:
             NeuronState.REFRACTORY: 'green'
         }
 
-        plt.scatter(time_points[self.find_spikes(membrane_potential)], membrane_potential[self.find_spikes(membrane_potential)], color='magenta', marker='o', label='Spikes')
-
-        # Plot membrane potential, changing color based on state
-        for i in range(len(states) - 1):
-            plt.plot(time_points[i:i+2], membrane_potential[i:i+2], color=state_colors.get(states[i], 'black'))
-
-        # Add a dummy plot for the legend
-        for state, color in state_colors.items():
-            plt.plot([], [], color=color, label=state.name)
+        # Plot membrane potential, changing color based on state (integer codes or NeuronState)
+        codes = np.array([s if isinstance(s, (int, np.integer)) else s.value for s in states])
+        spike_analysis.plot_membrane_potential(membrane_potential, codes, DT,
+                                               {state.value: color for state, color in state_colors.items()},
+                                               {state.value: state.name for state in state_colors})
         plt.xlabel('Time (s)')
         plt.ylabel('Membrane Potential (V)')
         if spiking_frequency is not None:
@@ -205,15 +194,19 @@ class Neuron:
             plt.savefig(output_file)
         plt.show()
 
-    def plot_spiking_frequency(self, spiking_frequencies: list, output_file: str = 'spiking_frequency.png'):
+    def plot_spiking_frequency(self, spiking_frequencies: list, output_file: str = 'spiking_frequency.png', currents = None):
         """
         Plot the spiking frequency over a range of input currents.
         Parameters:
         spiking_frequencies : list
             List of spiking frequencies for different input currents.
+        currents : array, optional
+            The input currents, the x axis is the index if not given.
         """
         plt.figure(figsize=(10,5))
-        plt.plot(spiking_frequencies, marker='o')
+        if currents is None:
+            currents = np.arange(len(spiking_frequencies))
+        plt.plot(currents, spiking_frequencies, marker='o' if len(spiking_frequencies) <= 100 else None)
         plt.xlabel('Input Current (A)')
         plt.ylabel('Spiking Frequency (Hz)')
         plt.title('Spiking Frequency vs Input Current')
@@ -235,16 +228,160 @@ class Neuron:
         print("Spiking frequency (Hz):", spiking_frequency)
         # self.plot_membrane_potential(membrane_potential, spiking_frequency=spiking_frequency, states=states, output_file='membrane_potential.png')
 
-        spike_frequencies = []
-        for current in np.arange(0, 10e-9, 1e-9):  # Loop through different current values
-            membrane_potential, states = self.LIF(current_I=current)
-            spike_indices = self.find_spikes(membrane_potential)
-            spiking_frequency = self.calculate_spiking_frequency(spike_indices, delta_t=DT)
+        # All currents at once, each on a fresh neuron
+        currents = np.arange(0, 10e-9, 1e-9)
+        spike_frequencies = LIFPopulation(currents).spiking_frequency(len(membrane_potential))
+        for current, spiking_frequency in zip(currents, spike_frequencies):
             print(f"Current: {current:.2e} A, Spiking frequency (Hz): {spiking_frequency:.2f}")
-            spike_frequencies.append(spiking_frequency)
-            # self.plot_membrane_potential(membrane_potential, spiking_frequency=spiking_frequency, states=states, output_file=f'membrane_potential_{current:.2e}.png')
 
-        self.plot_spiking_frequency(spike_frequencies, output_file='spiking_frequency.png')
-Neuron1 = Neuron()
-Neuron1.simulate(T, _I)
+        self.plot_spiking_frequency(spike_frequencies, output_file='spiking_frequency.png', currents=currents)
+
+
+# Integer state codes of the population simulator, same values as NeuronState
+READY = NeuronState.READY.value
+SODIUM_CHANNEL_OPEN = NeuronState.SODIUM_CHANNEL_OPEN.value
+POTASSIUM_CHANNEL_OPEN = NeuronState.POTASSIUM_CHANNEL_OPEN.value
+REFRACTORY = NeuronState.REFRACTORY.value
+
+REFRACTION_STEPS = int(round(REFRACTION_PERIOD / DT))
+
+
+def steps_to_level(um_0, um_inf, level, a, rising=True):
+    """
+    Smallest number of steps j >= 1 after which um_j = um_inf + (um_0 - um_inf) * a**j,
+    the Euler solution of the leaky membrane, is at or above level (below if not rising).
+    inf where that never happens.
+    """
+    sign = 1 if rising else -1
+    um_1 = um_inf + (um_0 - um_inf) * a
+    with np.errstate(divide='ignore', invalid='ignore'):
+        j = np.ceil(np.log((level - um_inf) / (um_0 - um_inf)) / np.log(a))
+    j = np.where(sign * (um_inf - level) > 0, np.maximum(j, 2), np.inf)
+    return np.where(sign * (um_1 - level) >= 0, 1, j)
+
+
+class LIFPopulation:
+    """
+    N independent copies of Neuron.LIF, one input current each, advanced together as arrays.
+    States are the integer codes above and the refractory period is counted per neuron in steps.
+    """
+    def __init__(self, currents, um_0=Um_0):
+        self.I = np.atleast_1d(np.asarray(currents, dtype=np.float64))
+        self.n = len(self.I)
+        self.um = np.full(self.n, um_0, dtype=np.float64)
+        self.state = np.full(self.n, REFRACTORY, dtype=np.int8)
+        self.timer = np.zeros(self.n, dtype=np.int64) # steps since the last state change
+
+    def step(self):
+        """
+        Advances all neurons by one time step DT.
+        """
+        um, state = self.um, self.state
+
+        refractory = np.where(um < U_REST, np.minimum(um + dum_dt(um, self.I/4) * DT, U_REST), um)
+        ready = um + dum_dt(um, self.I) * DT
+        sodium = um + SPIKING_VOLTAGE_GAIN * DT
+        potassium = np.where(um > U_REST, um + dum_dt(um, -10e-9) * DT, um + dum_dt(um, -5e-10) * DT)
+        um = np.choose(state - 1, [ready, sodium, potassium, refractory])
+
+        new_state = state.copy()
+        new_state[(state == REFRACTORY) & (self.timer >= REFRACTION_STEPS)] = READY
+        new_state[(state == READY) & (um >= U_THRESH)] = SODIUM_CHANNEL_OPEN
+        new_state[(state == SODIUM_CHANNEL_OPEN) & (um >= SPIKING_VOLTAGE_THRESH)] = POTASSIUM_CHANNEL_OPEN
+        new_state[(state == POTASSIUM_CHANNEL_OPEN) & (um <= U_REST + POTASSIUM_CHANNEL_CLOSE_OFFSET)] = REFRACTORY
+
+        self.timer[new_state != state] = 0
+        self.timer += 1
+        self.um, self.state = um, new_state
+
+    def run(self, n_steps=int(T // DT)):
+        """
+        Steps the population n_steps - 1 times from its current state.
+        Returns the membrane potentials and state codes, both of shape (N, n_steps).
+        """
+        um_t = np.zeros((self.n, n_steps))
+        states = np.zeros((self.n, n_steps), dtype=np.int8)
+        um_t[:, 0] = self.um
+        states[:, 0] = self.state
+        for idx in range(1, n_steps):
+            self.step()
+            um_t[:, idx] = self.um
+            states[:, idx] = self.state
+        return um_t, states
+
+    def spike_steps(self, n_steps=int(T // DT)):
+        """
+        Event driven fast path: jumps from one state change to the next with the closed form
+        of every phase instead of stepping, e.g. straight to the threshold crossing in READY.
+        Matches run() up to rounding, which can move a state change by one step.
+        Returns (neuron, step) index arrays of the spike peaks that find_spikes would detect
+        in the n_steps long trace of run(), sorted by neuron. Does not change the population.
+        """
+        a = 1 - DT / (Rm * Cm) # per step decay of the Euler update
+        n = self.n
+        k = np.zeros(n) # step of the last state change, inf once the neuron never changes again
+        um = self.um.copy()
+        state = self.state.copy()
+        # Length of the next refractory phase, shorter if the neuron is already in it
+        j_refractory = np.where(state == REFRACTORY, np.maximum(REFRACTION_STEPS - self.timer + 1, 1), REFRACTION_STEPS).astype(np.float64)
+
+        spike_neuron, spike_step = [], []
+        active = np.arange(n)
+        while len(active):
+            s, u, I = state[active], um[active], self.I[active]
+            j = np.zeros(len(active))
+            u_next = np.zeros(len(active))
+
+            m = s == READY
+            u_inf = U_REST + Rm * I[m]
+            j[m] = steps_to_level(u[m], u_inf, U_THRESH, a)
+            u_next[m] = u_inf + (u[m] - u_inf) * a**j[m]
+
+            m = s == SODIUM_CHANNEL_OPEN
+            j[m] = np.maximum(np.ceil((SPIKING_VOLTAGE_THRESH - u[m]) / (SPIKING_VOLTAGE_GAIN * DT)), 1)
+            u_next[m] = u[m] + j[m] * SPIKING_VOLTAGE_GAIN * DT
+
+            m = s == POTASSIUM_CHANNEL_OPEN
+            # Fast repolarization down to U_REST, then slow until the channel closes
+            u_close = U_REST + POTASSIUM_CHANNEL_CLOSE_OFFSET
+            u_fast, u_slow = U_REST + Rm * -10e-9, U_REST + Rm * -5e-10
+            j_fast = np.where(u[m] > U_REST, steps_to_level(u[m], u_fast, U_REST, a, rising=False), 0)
+            u_rest = u_fast + (u[m] - u_fast) * a**j_fast
+            j_slow = np.where(u_rest <= u_close, 0, steps_to_level(u_rest, u_slow, u_close, a, rising=False))
+            j[m] = j_fast + j_slow
+            u_next[m] = np.where(j_slow > 0, u_slow + (u_rest - u_slow) * a**j_slow, u_rest)
+
+            m = s == REFRACTORY
+            u_inf = U_REST + Rm * I[m] / 4
+            j[m] = j_refractory[active[m]]
+            u_next[m] = np.where(u[m] < U_REST, np.minimum(u_inf + (u[m] - u_inf) * a**j[m], U_REST), u[m])
+            j_refractory[active[m]] = REFRACTION_STEPS
+
+            k[active] += j
+            um[active] = u_next
+            state[active] = np.choose(s - 1, [SODIUM_CHANNEL_OPEN, POTASSIUM_CHANNEL_OPEN, REFRACTORY, READY])
+
+            # A peak at the end of the sodium phase, if find_spikes can see it
+            spiked = (s == SODIUM_CHANNEL_OPEN) & (k[active] <= n_steps - 2)
+            spike_neuron.append(active[spiked])
+            spike_step.append(k[active[spiked]])
+
+            active = active[k[active] < n_steps - 1]
+
+        spike_neuron = np.concatenate(spike_neuron)
+        spike_step = np.concatenate(spike_step).astype(np.int64)
+        order = np.lexsort((spike_step, spike_neuron))
+        return spike_neuron[order], spike_step[order]
+
+    def spiking_frequency(self, n_steps=int(T // DT)):
+        """
+        Spiking frequency of every neuron as in Neuron.calculate_spiking_frequency, from spike_steps.
+        """
+        neuron, step = self.spike_steps(n_steps)
+        return spike_analysis.spiking_frequency_batch(neuron, step, self.n, DT)
+
+
+if __name__ == '__main__':
+    Neuron1 = Neuron()
+    Neuron1.simulate(T, _I)
         
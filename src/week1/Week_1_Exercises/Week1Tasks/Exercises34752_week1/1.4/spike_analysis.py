@@ -0,0 +1,133 @@
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+
+def find_spikes(membrane_potential: np.ndarray):
+    """
+    Finds the spikes, the strict local maxima, of membrane potential traces.
+    Parameters:
+    membrane_potential : numpy array
+        A single trace (time,) or one trace per neuron (neurons, time).
+    Returns:
+    spike_indices : numpy array
+        For a single trace, the time indices of the spikes.
+    (neuron, step) : tuple of numpy arrays
+        For 2D traces, the neuron and time index of every spike, sorted by neuron and time.
+    """
+    um = np.asarray(membrane_potential)
+    mid = um[..., 1:-1]
+    is_peak = (um[..., :-2] < mid) & (mid > um[..., 2:])
+    if um.ndim == 1:
+        return np.flatnonzero(is_peak) + 1
+    neuron, step = np.nonzero(is_peak)
+    return neuron, step + 1
+
+def spiking_frequency(spike_indices, delta_t: float) -> float:
+    """
+    Average spiking frequency (Hz) of one spike train, 1 / mean interspike interval.
+    0 with less than two spikes.
+    """
+    if len(spike_indices) < 2:
+        return 0.0
+    isi = np.diff(spike_indices) * delta_t  # Interspike intervals in seconds
+    avg_isi = np.mean(isi)
+    return 1.0 / avg_isi if avg_isi > 0 else 0.0
+
+def spiking_frequency_batch(neuron: np.ndarray, step: np.ndarray, n_neurons: int, delta_t: float) -> np.ndarray:
+    """
+    spiking_frequency of every neuron at once, from the (neuron, step) spikes of find_spikes.
+    The mean interspike interval is (last - first) / (count - 1), so no per neuron loop is needed.
+    """
+    count = np.bincount(neuron, minlength=n_neurons)
+    first = np.zeros(n_neurons, dtype=np.int64)
+    last = np.zeros(n_neurons, dtype=np.int64)
+    # Spikes are sorted by neuron and time, so the start of every neuron's run is its first spike
+    starts = np.cumsum(count) - count
+    has_spikes = count > 0
+    first[has_spikes] = step[starts[has_spikes]]
+    last[has_spikes] = step[starts[has_spikes] + count[has_spikes] - 1]
+
+    frequency = np.zeros(n_neurons)
+    m = (count >= 2) & (last > first)
+    frequency[m] = (count[m] - 1) / ((last[m] - first[m]) * delta_t)
+    return frequency
+
+def isi_statistics(neuron: np.ndarray, step: np.ndarray, n_neurons: int, delta_t: float):
+    """
+    Interspike interval statistics of every neuron, from the (neuron, step) spikes of find_spikes.
+    Returns the mean and standard deviation of the intervals (s) and their coefficient of variation,
+    each of shape (n_neurons,) and nan for neurons with less than two spikes.
+    """
+    # Intervals between consecutive spikes of the same neuron
+    same = neuron[1:] == neuron[:-1]
+    isi = (np.diff(step) * delta_t)[same]
+    owner = neuron[1:][same]
+
+    n = np.bincount(owner, minlength=n_neurons)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.bincount(owner, isi, minlength=n_neurons) / n
+        var = np.bincount(owner, (isi - mean[owner])**2, minlength=n_neurons) / n
+        std = np.sqrt(var)
+        cv = std / mean
+    return mean, std, cv
+
+def state_segments(time_points: np.ndarray, membrane_potential: np.ndarray, states: np.ndarray):
+    """
+    Splits a trace into runs of constant state. Each run also gets the first sample of the next one,
+    so the line is continuous, and sample i to i+1 is drawn in the colour of states[i].
+    Returns the list of (n, 2) segments and the state of each.
+    """
+    states = np.asarray(states)
+    change = np.flatnonzero(states[1:-1] != states[:-2]) + 1
+    starts = np.concatenate(([0], change))
+    ends = np.concatenate((change, [len(states) - 1])) + 1
+    points = np.column_stack((time_points[:len(states)], membrane_potential[:len(states)]))
+    return [points[a:b] for a, b in zip(starts, ends)], states[starts]
+
+def plot_membrane_potential(membrane_potential: np.ndarray, states: np.ndarray, delta_t: float, state_colors: dict,
+                            state_names: dict = None, spike_indices = None, ax = None):
+    """
+    Plots a membrane potential trace coloured by state with one LineCollection, plus the spikes.
+    Parameters:
+    membrane_potential : numpy array
+        Membrane potential time series.
+    states : numpy array
+        State code of every sample.
+    state_colors : dict
+        Colour of every state code.
+    state_names : dict, optional
+        Legend label of every state code.
+    spike_indices : array, optional
+        Spike indices, found with find_spikes if not given.
+    """
+    if ax is None:
+        ax = plt.gca()
+    time_points = np.arange(len(membrane_potential)) * delta_t
+    if spike_indices is None:
+        spike_indices = find_spikes(membrane_potential)
+
+    ax.scatter(time_points[spike_indices], membrane_potential[spike_indices], color='magenta', marker='o', label='Spikes')
+
+    segments, segment_states = state_segments(time_points, membrane_potential, states)
+    lines = LineCollection(segments, colors=[state_colors.get(s, 'black') for s in segment_states])
+    ax.add_collection(lines)
+    ax.autoscale_view()
+
+    # Dummy plots for the legend
+    for state, color in state_colors.items():
+        ax.plot([], [], color=color, label=state_names[state] if state_names else str(state))
+    return ax
+
+if __name__ == '__main__':
+    import time
+
+    # A million sample spike train per neuron
+    rng = np.random.default_rng(0)
+    n_neurons, n_steps = 10, 1_000_000
+    um = np.sin(np.arange(n_steps) * 2*np.pi / rng.integers(100, 1000, (n_neurons, 1)))
+
+    t0 = time.perf_counter()
+    neuron, step = find_spikes(um)
+    frequency = spiking_frequency_batch(neuron, step, n_neurons, 1e-5)
+    mean, std, cv = isi_statistics(neuron, step, n_neurons, 1e-5)
+    print(f"{len(neuron)} spikes in {n_neurons} x {n_steps} samples, {time.perf_counter() - t0:.2f} s")
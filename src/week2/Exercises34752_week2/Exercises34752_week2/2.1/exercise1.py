@@ -1,6 +1,13 @@
+import sys
+from pathlib import Path
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import matplotlib.pyplot as plt
 
+sys.path.append(str(Path(__file__).resolve().parents[5] / 'project_work')) # shared modules in project_work/utils
+from utils.delay_line import DelayLine
+
 def sim_run(K : float, delay : float, simlen : int = 30, y0 : float = 1, target : float = 0) -> np.ndarray:
     """
     Runs a simulation with a given control gain and delay. Returns the state trajectory.
@@ -20,20 +27,93 @@ def sim_run(K : float, delay : float, simlen : int = 30, y0 : float = 1, target
     y = np.zeros((simlen))
     y[0] = y0
 
-    # Buffer to store delayed control inputs
-    u_buffer = np.zeros(simlen + delay)
+    # Delay line for the control inputs
+    u_delay = DelayLine(delay)
 
     for t in range(simlen-1):
         # Compute control input
         u = K * (target - y[t])
-        u_buffer[t + delay] = u  # Store control input to be applied after 'delay' steps
+        u_delay.push(u)  # Store control input to be applied after 'delay' steps
 
-        # Apply delayed control input
-        y[t+1] = 0.5*y[t] + 0.4*u_buffer[t+1]  # 1st order dynamics
+        # Apply delayed control input: the input computed at t enters y[t + delay]
+        # (so with delay 0 it never does)
+        u_applied = u_delay.read(delay - 1) if delay > 0 else 0
+        y[t+1] = 0.5*y[t] + 0.4*u_applied  # 1st order dynamics
 
     return y
 
-def batch_run(K_values : list, delay_values : list, simlen : int=30, y0 : float=1, target : float=0, show = True, output : str = "src/week2/Exercises34752_week2/Exercises34752_week2/2.1/2.1.figure.png") -> dict:
+def result_dtype(simlen : int) -> np.dtype:
+    """ One entry of a sweep: the (K, delay) pair and its state trajectory. """
+    return np.dtype([('K', np.float64), ('delay', np.int64), ('y', np.float64, (simlen,))])
+
+def sim_pairs(K : np.ndarray, delay : np.ndarray, simlen : int = 30, y0 : float = 1, target : float = 0) -> np.ndarray:
+    """
+    Runs sim_run for many (K, delay) pairs at once, as one recurrence over arrays with one lane per pair.
+    The trajectories are identical to those of sim_run.
+
+    Args:
+        K (np.ndarray): Control gain of every lane.
+        delay (np.ndarray): Time delay of every lane, in time steps.
+        simlen (int): Length of the simulation.
+        y0 (float): Initial state.
+        target (float): Target state.
+
+    Returns:
+        np.ndarray: Structured array (fields 'K', 'delay', 'y') with one entry per lane.
+    """
+    K = np.asarray(K, dtype=np.float64)
+    delay = np.asarray(delay, dtype=np.int64)
+    lanes = np.arange(len(K))
+
+    y = np.zeros((simlen, len(K)))
+    y[0] = y0
+    u = np.zeros((simlen, len(K))) # control inputs of every lane over time
+
+    # As in sim_run, the input computed at t enters y[t + delay] (never with delay 0)
+    for t in range(simlen-1):
+        u[t] = K * (target - y[t])
+
+        src = t + 1 - delay
+        u_applied = np.where((delay > 0) & (src >= 0), u[np.maximum(src, 0), lanes], 0)
+        y[t+1] = 0.5*y[t] + 0.4*u_applied  # 1st order dynamics
+
+    results = np.empty(len(K), dtype=result_dtype(simlen))
+    results['K'] = K
+    results['delay'] = delay
+    results['y'] = y.T
+    return results
+
+def sweep(K_values : list, delay_values : list, simlen : int = 30, y0 : float = 1, target : float = 0, chunk_size : int = 100000, n_workers : int = 1):
+    """
+    Simulates the whole K x delay grid, K major, in chunks of at most chunk_size pairs.
+    Yields the chunks in grid order as they are done. With n_workers > 1 the chunks are
+    spread over a process pool.
+
+    Args:
+        K_values (list): List of control gains.
+        delay_values (list): List of time delays.
+        simlen (int): Length of the simulation.
+        y0 (float): Initial state.
+        target (float): Target state.
+        chunk_size (int): Number of (K, delay) pairs simulated together.
+        n_workers (int): Number of worker processes.
+
+    Yields:
+        np.ndarray: Structured array (fields 'K', 'delay', 'y') for the next chunk of pairs.
+    """
+    K, delay = np.meshgrid(K_values, delay_values, indexing='ij')
+    K, delay = K.ravel(), delay.ravel()
+    K_chunks = [K[i:i+chunk_size] for i in range(0, len(K), chunk_size)]
+    delay_chunks = [delay[i:i+chunk_size] for i in range(0, len(K), chunk_size)]
+
+    if n_workers == 1:
+        for K, delay in zip(K_chunks, delay_chunks):
+            yield sim_pairs(K, delay, simlen, y0, target)
+    else:
+        with ProcessPoolExecutor(n_workers) as pool:
+            yield from pool.map(sim_pairs, K_chunks, delay_chunks, repeat(simlen), repeat(y0), repeat(target))
+
+def batch_run(K_values : list, delay_values : list, simlen : int=30, y0 : float=1, target : float=0, show = True, output : str = "src/week2/Exercises34752_week2/Exercises34752_week2/2.1/2.1.figure.png", n_workers : int = 1) -> np.ndarray:
     """
     Runs a batch simulation for different control gains and delays.
 
@@ -44,43 +124,58 @@ def batch_run(K_values : list, delay_values : list, simlen : int=30, y0 : float=
         y0 (float): Initial state.
         target (float): Target state.
         show (bool): Whether to show the plots.
+        output (str): Where to save the plots, None to not save them.
+        n_workers (int): Number of worker processes for large grids.
 
     Returns:
-        dict: A dictionary with keys as (K, delay) tuples and values as the state trajectories.
+        np.ndarray: Structured array of shape (len(K_values), len(delay_values)) with fields 'K', 'delay'
+        and 'y' (the state trajectory), so results[j, i] is the run with K_values[j] and delay_values[i].
     """
-    results = {}
-    for K in K_values:
-        for delay in delay_values:
-            y = sim_run(K, delay, simlen, y0, target)
-            results[(K, delay)] = y
+    results = np.concatenate(list(sweep(K_values, delay_values, simlen, y0, target, n_workers=n_workers)))
+    results = results.reshape(len(K_values), len(delay_values))
 
     if show or output:
-        n_plots = int(np.ceil(np.sqrt(len(delay_values))))
-        fig, ax = plt.subplots(n_plots, n_plots, figsize=(10, 8))
-        for i, delay in enumerate(delay_values):
-            for j, K in enumerate(K_values):
-                y = results[(K, delay)]
-                row = int(i // n_plots)
-                col = int(i % n_plots)
-                ax[row, col].plot(range(len(y)), y)
-            ax[row, col].set_title(f'delay={delay}')
-            ax[row, col].set_xlabel('Time step')
-            ax[row, col].set_ylabel('y')
-            ax[row, col].grid()
-            ax[row, col].legend([f'K={K}' for K in K_values])
-
-        fig.suptitle('State Trajectories for Different Control Gains and Delays', fontsize=16)
-        plt.tight_layout()
-
-        
-        if output:
-            plt.savefig(output)
-        if show:
-            plt.show()
-
-        
-
-K_VALUES = [0.1, 0.5, 1.0, 2.0]
-DELAY_VALUES = [0, 1, 2, 3]
-
-batch_run(K_VALUES, DELAY_VALUES)
+        plot_results(results, show, output)
+
+    return results
+
+def plot_results(results : np.ndarray, show = True, output : str = None):
+    """
+    Plots the state trajectories of batch_run, one subplot per delay.
+
+    Args:
+        results (np.ndarray): The structured array returned by batch_run.
+        show (bool): Whether to show the plots.
+        output (str): Where to save the plots, None to not save them.
+    """
+    K_values = results['K'][:, 0]
+    delay_values = results['delay'][0]
+
+    n_plots = int(np.ceil(np.sqrt(len(delay_values))))
+    fig, ax = plt.subplots(n_plots, n_plots, figsize=(10, 8))
+    for i, delay in enumerate(delay_values):
+        for j, K in enumerate(K_values):
+            y = results[j, i]['y']
+            row = int(i // n_plots)
+            col = int(i % n_plots)
+            ax[row, col].plot(range(len(y)), y)
+        ax[row, col].set_title(f'delay={delay}')
+        ax[row, col].set_xlabel('Time step')
+        ax[row, col].set_ylabel('y')
+        ax[row, col].grid()
+        ax[row, col].legend([f'K={K}' for K in K_values])
+
+    fig.suptitle('State Trajectories for Different Control Gains and Delays', fontsize=16)
+    plt.tight_layout()
+
+    if output:
+        plt.savefig(output)
+    if show:
+        plt.show()
+
+
+if __name__ == '__main__':
+    K_VALUES = [0.1, 0.5, 1.0, 2.0]
+    DELAY_VALUES = [0, 1, 2, 3]
+
+    batch_run(K_VALUES, DELAY_VALUES)
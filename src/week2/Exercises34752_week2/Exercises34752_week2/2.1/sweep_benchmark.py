@@ -0,0 +1,26 @@
+import time
+import numpy as np
+from exercise1 import sim_run, sweep
+
+## Stability map grid
+K_values = np.linspace(0, 4, 200)
+delay_values = np.arange(50)
+simlen = 100
+
+if __name__ == '__main__':
+    t0 = time.perf_counter()
+    y_ref = np.array([[sim_run(K, delay, simlen) for delay in delay_values] for K in K_values])
+    t_serial = time.perf_counter() - t0
+
+    print(f"{'runner':>22} {'pairs':>7} {'time [s]':>9} {'identical':>10}")
+    print(f"{'sim_run loop':>22} {y_ref[..., 0].size:>7} {t_serial:>9.3f} {'-':>10}")
+    for chunk_size, n_workers in [(100000, 1), (1000, 1), (1000, 4)]:
+        t0 = time.perf_counter()
+        results = np.concatenate(list(sweep(K_values, delay_values, simlen, chunk_size=chunk_size, n_workers=n_workers)))
+        t = time.perf_counter() - t0
+        identical = np.array_equal(results['y'].reshape(y_ref.shape), y_ref, equal_nan=True)
+        print(f"{f'sweep {chunk_size}/{n_workers} proc':>22} {len(results):>7} {t:>9.3f} {str(identical):>10}")
+
+    # Stability map: settled if the last 10 steps stay within 5% of the initial error
+    settled = (np.abs(results['y'][:, -10:]) < 0.05).all(axis=1).reshape(len(K_values), len(delay_values))
+    print(f"\nsettled pairs: {settled.sum()} of {settled.size}")
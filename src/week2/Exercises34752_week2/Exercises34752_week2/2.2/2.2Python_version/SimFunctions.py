@@ -37,6 +37,64 @@ class SimulationFunctions:
         return q
 
 
+    def minjerk_batch(self,init,final,t):
+        # minjerk for an array of times t, returns shape (len(t), 2)
+        init = np.asarray(init, dtype=float)
+        final = np.asarray(final, dtype=float)
+        t = np.asarray(t, dtype=float)
+
+        return init+(final-init)*(10*(t/self.T)**3-15*(t/self.T)**4+6*(t/self.T)**5)[:, None]
+
+    def invkinematics_batch(self,positions):
+        # invkinematics for an array of wrist positions (N, 2), returns joint angles (N, 2)
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+
+        q=np.zeros((len(positions),2))
+        q[:,1]=np.arccos((np.sum(np.square(positions),axis=1)-(self.le1**2+self.le2**2))/(2*self.le1*self.le2))
+        q[:,0]=np.arctan2(positions[:,1], positions[:,0])-q[:,1]/2
+
+        return q
+
+    def compile_segment(self,init,final,t):
+        """
+            Desired joint angles of one movement from init to final at the times t since its start,
+            from t = T on the planner holds its last position (as the loop in exercise2.py does)
+        """
+        t = np.asarray(t, dtype=float)
+        moving = t < self.T
+        last_planned = np.maximum.accumulate(np.where(moving, np.arange(len(t)), 0))
+
+        desired_pos = self.minjerk_batch(init, final, t)[last_planned]
+
+        return self.invkinematics_batch(desired_pos)
+
+    def compile_trajectory(self,targets,init,t,hold=0.02):
+        """
+            Precompute the joint angle, velocity and acceleration tables (len(t), 2) for a target sequence.
+            A movement lasts T, the next one starts once T+hold has passed, from the previous target.
+        """
+        t = np.asarray(t, dtype=float)
+        ang = np.zeros((len(t), 2))
+
+        i, start_t, seg_init = 0, t[0], init
+        for k, target in enumerate(targets):
+            table = self.compile_segment(seg_init, target, t[i:]-start_t)
+
+            done = (t[i:]-start_t >= self.T+hold)
+            if k == len(targets)-1 or not done.any():
+                ang[i:] = table
+                break
+
+            # The step that sees the movement done still belongs to it
+            j = np.argmax(done)
+            ang[i:i+j+1] = table[:j+1]
+            i, start_t, seg_init = i+j+1, t[i+j], target
+
+        vel = np.gradient(ang, t, axis=0)
+        acc = np.gradient(vel, t, axis=0)
+
+        return ang, vel, acc
+
     def pdcontroller(self,desired_angle, delayed_angle, delayed_velocity):
 
         torque = np.zeros((2))
@@ -87,3 +145,62 @@ class SimulationFunctions:
         wrist_pos = elbow_pos + rotation_matrix @ wrist_vector
 
         return elbow_pos, wrist_pos
+
+
+class TwoLinkDynamics:
+    '''
+        The equations of SimulationFunctions.plant for many arms at once.
+        Terms that only depend on the arm parameters are computed once here,
+        states are (B, 2) arrays of [shoulder, elbow] values, one row per arm.
+    '''
+
+    def __init__(self, Var):
+
+        self.dt = Var[1]
+        le1, le2, m1, m2, g = Var[5], Var[6], Var[7], Var[8], Var[9]
+
+        # Constant terms, same association order as in plant so results are identical
+        inertia1 = m1*(le1/2)**2
+        inertia2 = m2*(le2/2)**2
+        self.m2le1le2 = m2*le1*le2
+        self.half_m2le1le2 = (m2*le1*le2)/2
+
+        self.inertia2 = inertia2
+        self.inertia12 = inertia1+inertia2
+        self.k1 = (m1*le1**2+m2*le2**2)/4
+        self.k2 = m2*le1**2
+        self.m2le2_4 = (m2*le2**2)/4
+        self.inertial_component2 = inertia2+((m1*le2**2)/4)
+        self.inertia2_m2le2_4 = inertia2+((m2*le2**2)/4)
+
+    def accelerations(self, ang, vel, torque):
+        cos1 = np.cos(ang[:, 1])
+        sin1 = np.sin(ang[:, 1])
+        v0, v1 = vel[:, 0], vel[:, 1]
+
+        centripetal_torque1 = self.inertia2+self.half_m2le1le2*cos1+self.m2le2_4
+        centripetal_torque2 = self.half_m2le1le2*sin1
+        coriolis_torque = self.m2le1le2*v0*v1*sin1
+        inertial_component1 = self.inertia12+(self.m2le1le2*cos1)+self.k1+self.k2
+        interaction_inertial_torque = self.inertia2_m2le2_4+self.half_m2le1le2*cos1
+
+        acc = np.empty_like(vel)
+        acc[:, 0] = (torque[:, 0]-(((v0**2*centripetal_torque2)/self.inertial_component2)*centripetal_torque1+v1**2*centripetal_torque2-coriolis_torque) / (inertial_component1-((interaction_inertial_torque/self.inertial_component2)*centripetal_torque1)))
+        acc[:, 1] = (torque[:, 1]-acc[:, 0]*centripetal_torque1-v0**2*centripetal_torque2)/self.inertial_component2
+
+        return acc
+
+    def step(self, ang, vel, torque):
+        '''
+            One Euler step for every arm, returns new (ang, vel, acc) arrays of shape (B, 2),
+            the inputs are not modified
+        '''
+        ang = np.asarray(ang, dtype=float).reshape(-1, 2)
+        vel = np.asarray(vel, dtype=float).reshape(-1, 2)
+        torque = np.asarray(torque, dtype=float).reshape(-1, 2)
+
+        acc = self.accelerations(ang, vel, torque)
+        vel = vel+self.dt*acc
+        ang = ang+self.dt*vel
+
+        return ang, vel, acc
@@ -0,0 +1,38 @@
+import time
+import numpy as np
+from SimFunctions import SimulationFunctions, TwoLinkDynamics
+
+# Same parameters as exercise2.py
+Var = [0.6, 0.01, 6.0, 400.0, 11, 0.3, 0.3, 3, 3, -9.8]
+Sim = SimulationFunctions(Var)
+dynamics = TwoLinkDynamics(Var)
+
+n_steps = 200
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+
+    print(f"{'arms':>6} {'plant [us/arm step]':>20} {'TwoLinkDynamics [us/arm step]':>30} {'identical':>10}")
+    for B in [1, 10, 100, 1000]:
+        # Around the start pose of exercise2.py, open loop torques
+        ang0 = np.array([-np.pi / 4, np.pi]) + rng.uniform(-0.1, 0.1, (B, 2))
+        vel0 = np.zeros((B, 2))
+        torque = rng.uniform(-1, 1, (n_steps, B, 2))
+
+        # Scalar plant, one arm at a time
+        t0 = time.perf_counter()
+        ang_ref = np.zeros((B, 2))
+        for b in range(B):
+            ang, vel, acc = list(ang0[b]), list(vel0[b]), [0, 0]
+            for i in range(n_steps):
+                ang, vel, acc = Sim.plant(ang, vel, acc, torque[i, b])
+            ang_ref[b] = ang
+        t_plant = (time.perf_counter() - t0)/(B*n_steps)
+
+        t0 = time.perf_counter()
+        ang, vel = ang0, vel0
+        for i in range(n_steps):
+            ang, vel, acc = dynamics.step(ang, vel, torque[i])
+        t_batch = (time.perf_counter() - t0)/(B*n_steps)
+
+        print(f"{B:>6} {t_plant*1e6:>20.2f} {t_batch*1e6:>30.2f} {str(np.array_equal(ang, ang_ref, equal_nan=True)):>10}")
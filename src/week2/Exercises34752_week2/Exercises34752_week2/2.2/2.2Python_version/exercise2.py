@@ -1,3 +1,5 @@
+import sys
+from pathlib import Path
 import numpy as np
 import matplotlib.pyplot as plt
 import time
@@ -5,6 +7,9 @@ import matplotlib.animation as animation
 # from numpy.core.fromnumeric import size
 from SimFunctions import SimulationFunctions
 
+sys.path.append(str(Path(__file__).resolve().parents[6] / 'project_work')) # shared modules in project_work/utils
+from utils.delay_line import DelayLine
+
 ## Parameters
 NOISE = 0
 DELAY = 3
@@ -81,15 +86,9 @@ curr_target = 0
 start_t = 0
 
 # TODO define time steps of delay
-# Define delay buffer for angles and velocities
+# Define delay line for angles and velocities, rows [angle, velocity]
 delay_steps = DELAY  # Number of time steps to delay
-ang_buffer = np.zeros((delay_steps + 1, 2))  # Buffer to store past angles
-vel_buffer = np.zeros((delay_steps + 1, 2))  # Buffer to store past velocities
-
-# Initialize buffers with current values
-for i in range(delay_steps + 1):
-    ang_buffer[i, :] = ang
-    vel_buffer[i, :] = vel
+state_delay = DelayLine(delay_steps, (2, 2), init=[ang, vel])  # Initialized with current values
 
 
 ## Simulation - plot setup
@@ -101,8 +100,13 @@ ax.set_ylabel("meters", fontsize=10)
 ax.set_xlim([-0.5, 0.5])
 ax.set_ylim([-0.5, 0.5])
 
+# Joint angle table of the current movement, compiled when the movement starts
+times = np.arange(0, int(L), dt)
+desired_ang_table = Sim.compile_segment(init_wrist_pos, final_wrist_pos[curr_target], times - start_t)
+table_start = 0
+
 Time = time.time()
-for t in np.arange(0, int(L), dt):
+for i, t in enumerate(times):
     # Update records
     ang_rec[round(t / dt) + 1, :] = ang
     vel_rec[round(t / dt) + 1, :] = vel
@@ -110,30 +114,18 @@ for t in np.arange(0, int(L), dt):
     if t > 0:
         jerk_rec[round(t / dt) + 1, :] = acc - acc_rec[round(t / dt), :]
 
-    ## Current wrist target
-    current_wrist_target = final_wrist_pos[curr_target][:]
-
     if curr_target <= 7:
-        ## Planner
-        # Get desired position from planner
-        if t - start_t < T:
-            desired_pos = Sim.minjerk(init_wrist_pos, current_wrist_target, t - start_t)
-
-        ## Inverse kinematics
-        # Get desired angle from inverse kinematics
-        desired_ang = np.real(Sim.invkinematics(desired_pos)).ravel()
+        ## Planner + inverse kinematics
+        # Get desired angle from the precompiled minimum jerk table
+        desired_ang = desired_ang_table[i - table_start]
 
         ## Inverse dynamics
         ## TODO Define delayed angles and velocities
-        # Update delay buffers - shift old values and add new ones
-        ang_buffer[1:, :] = ang_buffer[:-1, :]  # Shift buffer
-        vel_buffer[1:, :] = vel_buffer[:-1, :]  # Shift buffer
-        ang_buffer[0, :] = ang  # Add current angle to buffer
-        vel_buffer[0, :] = vel  # Add current velocity to buffer
-        
-        # Get delayed values from buffer
-        delayed_ang = ang_buffer[delay_steps, :].copy()  # Get delayed angle
-        delayed_vel = vel_buffer[delay_steps, :].copy()  # Get delayed velocity
+        # Add current angle and velocity to the delay line
+        state_delay.push([ang, vel])
+
+        # Get delayed values from the delay line
+        delayed_ang, delayed_vel = state_delay.read()
 
         ## TODO Compute torque with delayed angles and velocities
 
@@ -165,6 +157,10 @@ for t in np.arange(0, int(L), dt):
             init_wrist_pos = wrist_pos
             start_t = t
 
+            # Starts at the actual wrist position, so it can only be compiled now
+            desired_ang_table = Sim.compile_segment(init_wrist_pos, final_wrist_pos[curr_target], times[i + 1:] - start_t)
+            table_start = i + 1
+
 # Plot arm, wrist path, and targets -- ANIMATION
 if animation:
     ax.scatter(
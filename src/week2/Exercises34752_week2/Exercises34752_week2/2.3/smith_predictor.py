@@ -0,0 +1,104 @@
+import sys
+from pathlib import Path
+import numpy as np
+import matplotlib.pyplot as plt
+
+sys.path.append(str(Path(__file__).resolve().parents[5] / 'project_work')) # shared modules in project_work/utils
+from utils.delay_line import DelayLine
+
+def step_perturbation(tvec, pert_start_time, pert_end_time, pert_amp):
+    """ Perturbation profile of exercise 2.3: pert_amp between the start and end time (s), 0 elsewhere. """
+    return np.where((tvec > pert_start_time) & (tvec < pert_end_time), pert_amp, 0.)
+
+def simulate(Kp_forward, Kd_forward, Kp_feedback, delay, perturbations, Kd_feedback=0.3,
+             dt=0.001, max_time=2, mvt_start_time=0.5, final_target_ang=np.pi/2, m=1, arm_length=0.3, dampCoeff=0.5):
+    """
+        The forward model + delayed feedback controller of exercise 2.3, for every combination
+        of Kp_forward x Kd_forward x Kp_feedback x delay (s) x perturbation profile at once.
+        perturbations has shape (n_profiles, n_steps), or (n_steps,) for a single profile.
+
+        Returns a dict of the 'ang', 'ang_estimated', 'ang_delayed', 'torque' and 'target'
+        histories, each of shape (n_steps, len(Kp_forward), len(Kd_forward), len(Kp_feedback),
+        len(delay), n_profiles). A single combination reproduces exercise3.py exactly.
+    """
+    INERTIA = 1/3 * m *(arm_length)**2
+    tvec = np.arange(0, max_time, dt)
+    perturbations = np.atleast_2d(perturbations)
+
+    grid = np.meshgrid(np.atleast_1d(Kp_forward), np.atleast_1d(Kd_forward), np.atleast_1d(Kp_feedback),
+                       np.atleast_1d(delay), np.arange(len(perturbations)), indexing='ij')
+    shape = grid[0].shape
+    Kp_forward, Kd_forward, Kp_feedback, delay, profile = [g.ravel() for g in grid]
+    n = len(profile)
+
+    # Delayed versions of joint angle and velocity, channels [angle, velocity]
+    delay_index = (delay/dt).astype(int)
+    delayed_state = DelayLine(delay_index.max(), (2, n))
+
+    # Plant and forward model states
+    ang_actual = np.zeros(n)
+    vel_actual = np.zeros(n)
+    ang_estimated = np.zeros(n)
+    vel_estimated = np.zeros(n)
+
+    hist = {k: np.zeros((len(tvec), n)) for k in ['ang', 'ang_estimated', 'ang_delayed', 'torque', 'target']}
+    pert_lanes = perturbations[profile].T # (n_steps, n)
+    for i, t in enumerate(tvec):
+        # Set the desired joint angle once the movement start time is reached
+        if t < mvt_start_time:
+            target_ang = 0
+        else:
+            target_ang = final_target_ang
+
+        # Forward model torque
+        forward_torque = Kp_forward * (target_ang - ang_estimated) + Kd_forward * ( - vel_estimated)
+        # Feedback torque delayed
+        delayed_ang, delayed_vel = delayed_state.read(delay_index)
+        feedback_torque = Kp_feedback * (target_ang - delayed_ang) + Kd_feedback * ( - delayed_vel)
+
+        # Total torque
+        total_torque = forward_torque + feedback_torque
+
+        # Forward model of arm_dynamics
+        acc_estimated = (total_torque - dampCoeff*vel_estimated ) / INERTIA
+        vel_estimated = vel_estimated + dt * acc_estimated
+        ang_estimated = ang_estimated + dt * vel_estimated
+
+        # Plant - forward model of the arm
+        acc = (total_torque - dampCoeff*vel_actual + pert_lanes[i]) / INERTIA
+        vel_actual = vel_actual + dt * acc
+        ang_actual = ang_actual + dt * vel_actual
+
+        # Update delayed copy of joint angle and velocity
+        delayed_state.push([ang_actual, vel_actual])
+
+        hist['ang'][i] = ang_actual
+        hist['ang_estimated'][i] = ang_estimated
+        hist['ang_delayed'][i] = delayed_state.read(delay_index)[0]
+        hist['torque'][i] = total_torque
+        hist['target'][i] = target_ang
+
+    return {k: v.reshape((len(tvec),) + shape) for k, v in hist.items()}
+
+if __name__ == '__main__':
+    # Robustness of the forward model controller to feedback delay and perturbation size
+    dt, max_time = 0.001, 2
+    tvec = np.arange(0, max_time, dt)
+    pert_amps = np.linspace(0, 2, 5)
+    perturbations = np.array([step_perturbation(tvec, 1.2, 1.5, amp) for amp in pert_amps])
+    delays = np.linspace(0, 0.2, 11)
+
+    hist = simulate([0, 5], 0.3, 5, delays, perturbations, dt=dt, max_time=max_time)
+
+    # RMS tracking error from the movement start
+    moving = tvec >= 0.5
+    rmse = np.sqrt(np.mean((hist['ang'] - hist['target'])[moving]**2, axis=0))[:, 0, 0] # (Kp_forward, delay, pert)
+
+    f, axs = plt.subplots(1, 2, sharey=True, figsize=(10, 4))
+    for ax, Kp_f, e in zip(axs, [0, 5], rmse):
+        im = ax.imshow(e.T, origin='lower', aspect='auto', extent=[delays[0], delays[-1], pert_amps[0], pert_amps[-1]])
+        ax.set_title(f'Kp_forward={Kp_f}')
+        ax.set_xlabel('delay (s)')
+        f.colorbar(im, ax=ax, label='RMSE (rad)')
+    axs[0].set_ylabel('perturbation amplitude')
+    plt.show()
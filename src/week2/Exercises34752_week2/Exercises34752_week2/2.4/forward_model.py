@@ -0,0 +1,138 @@
+import sys
+from pathlib import Path
+import numpy as np
+import matplotlib.pyplot as plt
+
+sys.path.append(str(Path(__file__).resolve().parents[5] / 'project_work')) # shared modules in project_work/utils
+from utils.delay_line import DelayLine
+
+class ForwardModelLearner:
+    """
+        The arm of exercise 2.4 under Smith predictor feedback, with the forward model
+        acc_estimated = w1*torque + w2*vel_estimated learned by gradient descent on the
+        delayed acceleration error. Every lane has its own delay_estimate and alpha and
+        all lanes are stepped together; a single lane reproduces exercise4.py exactly.
+    """
+    def __init__(self, delay_estimate, alpha, delay_true=10, dt=0.005, max_time=2, mvt_start_time=0.5,
+                 m=1, arm_length=0.3, dampCoeff=0.5, Kp=30, Kv=2, desired_end_pos=np.pi/2):
+        # delay_estimate, alpha: scalars or arrays, broadcast to one value per lane
+        delay_estimate, alpha = np.broadcast_arrays(np.atleast_1d(delay_estimate), alpha)
+        self.delay_estimate = delay_estimate.astype(np.int64)
+        self.alpha = alpha.astype(np.float64)
+        self.n_lanes = len(self.alpha)
+
+        self.delay_true = delay_true
+        self.dt = dt
+        self.tvec = np.arange(0, max_time, dt)
+        self.mvt_start_time = mvt_start_time
+
+        # arm model
+        self.I = m *(arm_length/2)**2
+        self.dampCoeff = dampCoeff
+
+        # controller parameters
+        self.Kp = Kp
+        self.Kv = Kv
+        self.desired_end_pos = desired_end_pos
+
+        # learned weights, kept across trials
+        self.w1 = np.zeros(self.n_lanes)
+        self.w2 = np.zeros(self.n_lanes)
+
+    def run_trial(self):
+        """ One movement with learning. Returns the (n_steps, n_lanes) histories of the trial. """
+        n = self.n_lanes
+        vel = np.zeros(n)
+        pos = np.zeros(n)
+        vel_estimated = np.zeros(n)
+        pos_estimated = np.zeros(n)
+
+        # channels [acc, vel, pos]
+        delayed = DelayLine(self.delay_true, (3, n))
+        # channels [feedback_torque, acc_estimated, vel_estimated, pos_estimated]
+        estimated_delayed = DelayLine(self.delay_estimate.max(), (4, n))
+        # the Smith predictor reads the delayed copies before this step's sample is pushed
+        lag_true = max(self.delay_true-1, 0)
+        lag_estimate = np.maximum(self.delay_estimate-1, 0)
+
+        hist = {k: np.zeros((len(self.tvec), n)) for k in ['acc', 'acc_estimated', 'vel', 'vel_estimated', 'pos', 'pos_estimated', 'torque']}
+        for i, t in enumerate(self.tvec):
+            if t < self.mvt_start_time:
+                desired_pos = 0
+            else:
+                desired_pos = self.desired_end_pos
+
+            # feedback torque
+            _, vel_delayed, pos_delayed = delayed.read(lag_true)
+            _, _, vel_estimated_delayed, pos_estimated_delayed = estimated_delayed.read(lag_estimate)
+            pos_err = (desired_pos - pos_estimated) - pos_delayed + pos_estimated_delayed
+            vel_err = (- vel_estimated) - vel_delayed + vel_estimated_delayed
+
+            feedback_torque = self.Kp * pos_err + self.Kv * vel_err
+
+            # arm forward dynamics
+            acc = (feedback_torque - self.dampCoeff*vel) / self.I
+            vel = vel + self.dt * acc
+            pos = pos + self.dt * vel
+            delayed.push([acc, vel, pos])
+
+            # forward model of arm_dynamics
+            acc_estimated = self.w1*feedback_torque + self.w2*vel_estimated
+            vel_estimated = vel_estimated + self.dt * acc_estimated
+            pos_estimated = pos_estimated + self.dt * vel_estimated
+            estimated_delayed.push([feedback_torque, acc_estimated, vel_estimated, pos_estimated])
+
+            # learning the weights with gradient descent
+            acc_delayed = delayed.read()[0]
+            feedback_torque_delayed, acc_estimated_delayed, vel_estimated_delayed, _ = estimated_delayed.read(self.delay_estimate)
+            error = (acc_delayed - acc_estimated_delayed)
+            self.w1 = self.w1 + self.alpha*error*feedback_torque_delayed
+            self.w2 = self.w2 + self.alpha*error*vel_estimated_delayed
+
+            hist['acc'][i] = acc
+            hist['acc_estimated'][i] = acc_estimated
+            hist['vel'][i] = vel
+            hist['vel_estimated'][i] = vel_estimated
+            hist['pos'][i] = pos
+            hist['pos_estimated'][i] = pos_estimated
+            hist['torque'][i] = feedback_torque
+
+        return hist
+
+    def train(self, n_trials):
+        """ Runs n_trials trials. Returns the (n_trials, n_lanes) weight histories w1_hist, w2_hist. """
+        w1_hist = np.zeros((n_trials, self.n_lanes))
+        w2_hist = np.zeros((n_trials, self.n_lanes))
+
+        # Lanes that diverge run to nan without affecting the others
+        with np.errstate(over='ignore', invalid='ignore'):
+            for i in range(n_trials):
+                self.run_trial()
+                w1_hist[i] = self.w1
+                w2_hist[i] = self.w2
+        return w1_hist, w2_hist
+
+if __name__ == '__main__':
+    # Learning convergence against delay mismatch, delay_true = 10
+    delay_estimates = np.arange(5, 16)
+    alphas = np.array([1e-6, 3e-6, 1e-5])
+    d, a = np.meshgrid(delay_estimates, alphas, indexing='ij')
+
+    learner = ForwardModelLearner(d.ravel(), a.ravel())
+    w1_hist, w2_hist = learner.train(40)
+
+    # True weights: acc = (torque - dampCoeff*vel)/I
+    print(f"true w1 {1/learner.I:.2f}, w2 {-learner.dampCoeff/learner.I:.2f}")
+    print(f"{'delay_estimate':>14} {'alpha':>7} {'w1':>10} {'w2':>10}")
+    for k in range(learner.n_lanes):
+        print(f"{learner.delay_estimate[k]:>14} {learner.alpha[k]:>7.0e} {w1_hist[-1, k]:>10.2f} {w2_hist[-1, k]:>10.2f}")
+
+    f, (ax1, ax2) = plt.subplots(2, 1, sharex=True)
+    for k in np.flatnonzero(learner.alpha == alphas[-1]):
+        ax1.plot(w1_hist[:, k], label=f'delay_estimate={learner.delay_estimate[k]}')
+        ax2.plot(w2_hist[:, k])
+    ax1.set_ylabel('w1')
+    ax2.set_ylabel('w2')
+    ax2.set_xlabel('trial')
+    ax1.legend(fontsize=6)
+    plt.show()
@@ -20,21 +20,28 @@ class CMAC:
 
         self.beta = beta
 
-        self.B = None
+        # Activation buffers, allocated once and reused by every predict call
+        self.phi = np.zeros((2, self.n_rfs))
+        self.B = np.zeros((self.n_rfs, self.n_rfs))
         self.y = None
 
+    def activations(self, x):
+        """ Compute the receptive field activations for x into `self.B` (in place) """
+        x = np.asarray(x, dtype=float)
+
+        np.subtract(x[:, None], self.mu, out=self.phi)
+        self.phi **= 2
+        self.phi /= self.sigma[:, None]**2
+        np.exp(-self.phi, out=self.phi) # GaussianBasisFunction for both input dimensions at once
+
+        np.multiply(self.phi[0, :, None], self.phi[1, None, :], out=self.B) # outer product phi_0 x phi_1
+        return self.B
+
     def predict(self, x):
         """ Predict yhat given x
             Saves activations `B` for later weight update
         """
-        phi = np.zeros((2, self.n_rfs))
-        for k in range(2):
-            phi[k] = GaussianBasisFunction(x[k], self.mu[k], self.sigma[k]) # for i in phi_ki at the same time
-
-        self.B = np.zeros((self.n_rfs, self.n_rfs))
-        for i in range(self.n_rfs):
-            for j in range(self.n_rfs):
-                self.B[i,j] = phi[0][i] * phi[1][j]
+        self.activations(x)
 
         yhat = np.dot(self.w.ravel(), self.B.ravel()) # Element-wise multiplication and summing of all elements
 
@@ -47,6 +54,51 @@ class CMAC:
         """
         self.w += self.beta*e*self.B
 
+    def batch_activations(self, X):
+        """ Per-dimension activations phi for a batch of inputs
+            X has shape (N, 2); returns phi with shape (N, 2, n_rfs)
+        """
+        X = np.asarray(X, dtype=float)
+
+        return GaussianBasisFunction(X[:, :, None], self.mu, self.sigma[:, None])
+
+    def predict_batch(self, X):
+        """ Predict yhat for every row of X at once, returns shape (N,) """
+        phi = self.batch_activations(X)
+
+        return np.sum((phi[:, 0] @ self.w) * phi[:, 1], axis=1) # phi_0^T w phi_1 per sample
+
+    def learn_batch(self, X, E):
+        """ 
+        Summed covariance update for a batch of inputs X and errors E
+        Same as calling predict(x) and learn(e) for every row, as E is fixed the order does not matter.
+        """
+        phi = self.batch_activations(X)
+        E = np.asarray(E, dtype=float)
+
+        self.w += self.beta * (phi[:, 0].T * E) @ phi[:, 1]
+
+    def train_batch(self, X, yd, sequential=True):
+        """ 
+        Fit the desired outputs yd for a batch of inputs X, returns the errors (N,)
+        sequential: update the weights after every sample (as a predict/learn loop does),
+                    otherwise one summed update using the errors of the whole batch
+        """
+        phi = self.batch_activations(X)
+        yd = np.asarray(yd, dtype=float)
+
+        if not sequential:
+            e = yd - np.sum((phi[:, 0] @ self.w) * phi[:, 1], axis=1)
+            self.w += self.beta * (phi[:, 0].T * e) @ phi[:, 1]
+            return e
+
+        # Activations are precomputed, only the weight dependent part stays in the loop
+        e = np.zeros(len(phi))
+        for n in range(len(phi)):
+            e[n] = yd[n] - phi[n, 0] @ self.w @ phi[n, 1]
+            self.w += np.outer(self.beta*e[n]*phi[n, 0], phi[n, 1])
+        return e
+
 
 if __name__ == '__main__':
     n_rfs = 11
@@ -57,26 +109,18 @@ if __name__ == '__main__':
     c = CMAC(n_rfs, xmin, xmax, 1e-2)
     print(c.w.shape)
 
-    for _ in range(1000):
-        e_vec = []
-        for x1 in np.linspace(0, 1, 11):
-            for x2 in np.linspace(0, 1, 11):
-                x = [x1, x2]
-
-                yhat = c.predict(x)
-
-                yd = np.arctan2(x[0], x[1])
+    x1, x2 = np.meshgrid(np.linspace(0, 1, 11), np.linspace(0, 1, 11), indexing='ij')
+    X = np.stack([x1.ravel(), x2.ravel()], axis=1)
+    yd = np.arctan2(X[:, 0], X[:, 1])
 
-                e = yd - yhat
-
-                c.learn(e)
-                e_vec.append(e**2)
+    for _ in range(1000):
+        e = c.train_batch(X, yd)
 
-        print(np.mean(e_vec))
+        print(np.mean(e**2))
 
     # Test values
     x = [0.5, 0.5]
     print(c.predict(x), np.arctan2(x[0], x[1]))
 
     x = [0.2, 0.5]
-    print(c.predict(x), np.arctan2(x[0], x[1]))
\ No newline at end of file
+    print(c.predict(x), np.arctan2(x[0], x[1]))